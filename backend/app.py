@@ -1,42 +1,168 @@
-import os
-from flask import Flask, request, jsonify, send_from_directory
-from werkzeug.utils import secure_filename
-from flask_cors import CORS
-from PIL import Image
+import time
 
-from utils.background import remove_background
-from utils.colors import extract_palette
-from utils.text_gen import generate_creative_text
-from utils.templates_engine import generate_all_creatives
-from utils.layout_suggestions import suggest_layout
+# Measures how long importing the app takes; see /readyz and /metrics.
+_import_start = time.perf_counter()
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+from functools import lru_cache
+import hashlib
+import json
+import os
+from flask import Flask, Response, abort, g, request, jsonify, send_from_directory
+from flask_cors import CORS
+from werkzeug.security import safe_join
 
-UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
-PROCESSED_FOLDER = os.path.join(BASE_DIR, "processed")
-CREATIVES_FOLDER = os.path.join(BASE_DIR, "creatives")
+from utils.artifacts import CREATIVES, PROCESSED, start_janitor
+from utils.background import is_ready, start_warmup, warmup_error
+from utils.catalogue import iter_uploads, spool_uploads, stream_catalogue
+from utils.encoders import parse_output
+from utils.jobs import JobManager, QueueFull
+from utils import metrics
+from utils.pipeline import run_pipeline, run_variants
+from utils.templates_engine import parse_variants, render_creative
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(PROCESSED_FOLDER, exist_ok=True)
-os.makedirs(CREATIVES_FOLDER, exist_ok=True)
+PROCESSED_FOLDER = PROCESSED.folder
+CREATIVES_FOLDER = CREATIVES.folder
 
 app = Flask(__name__)
 CORS(app)
 
+jobs = JobManager()
+
+# Artifact URLs name their content (an upload's hash, or a render spec id that
+# hashes every render input), so the bytes behind a URL never change and
+# clients and CDNs may keep them for good.
+ARTIFACT_MAX_AGE = 365 * 24 * 3600
+ETAG_CACHE_SIZE = 4096
+
+metrics.STARTUP_SECONDS.set(time.perf_counter() - _import_start, phase="import")
+
+
+def worker_state() -> dict:
+    state = {"ready": is_ready(), "startup_seconds": metrics.startup_report()}
+    if warmup_error():
+        state["error"] = warmup_error()
+    return state
+
+
+def start_background_tasks() -> None:
+    """
+    Load and warm the background-removal model before the first request,
+    keep uploads/, processed/ and creatives/ within their disk budgets, and
+    share this process's metrics and readiness with the other workers.
+    """
+    start_warmup()
+    start_janitor()
+    metrics.start_exporter(worker_state)
+
+
+# Skipped in the debug reloader's watcher process, which never serves, and
+# under gunicorn.conf.py, which starts them in each worker after the fork.
+if os.environ.get("DEFER_BACKGROUND_TASKS") != "1" and (
+    __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+):
+    start_background_tasks()
+
+
+@app.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+    g.timings_token = metrics.start_request_timings()
+    metrics.HTTP_IN_FLIGHT.inc()
+
+
+@app.after_request
+def add_server_timing(response):
+    if "timings_token" in g:
+        total = time.perf_counter() - g.request_start
+        timings = metrics.finish_request_timings(g.pop("timings_token"))
+        metrics.HTTP_SECONDS.observe(total, endpoint=request.endpoint or "unknown")
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings, total)
+    return response
+
+
+@app.teardown_request
+def end_timing(exc):
+    metrics.HTTP_IN_FLIGHT.dec()
+
 
 @app.route("/")
 def home():
     return "Backend running"
 
 
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving."""
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz")
+def readyz():
+    """
+    Readiness: 503 until the background-removal model is loaded and warm.
+
+    Under gunicorn.conf.py, in every worker: any of them may get the next
+    request. Each worker's state is listed by pid.
+    """
+    state = worker_state()
+    workers = metrics.worker_states(state)
+    expected = int(os.environ.get("WEB_WORKERS", "1")) if metrics.METRICS_DIR else 1
+    ready = len(workers) >= expected and all(w["ready"] for w in workers.values())
+    body = {**state, "ready": ready, "workers": {str(pid): w for pid, w in sorted(workers.items())}}
+    return jsonify(body), 200 if ready else 503
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Prometheus metrics; under gunicorn.conf.py, of every worker, labelled by its pid."""
+    return Response(metrics.render_all(), mimetype="text/plain; version=0.0.4")
+
+
+@lru_cache(maxsize=ETAG_CACHE_SIZE)
+def _file_etag(path: str, mtime_ns: int, size: int) -> str:
+    """Hash of a file's bytes; keyed by mtime and size so a rewritten file is hashed again."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()[:32]
+
+
+metrics.register_lru("etag", _file_etag)
+
+
+def send_artifact(folder: str, filename: str) -> Response:
+    """
+    A generated file with a long-lived immutable Cache-Control and a strong ETag.
+
+    Conditional requests get 304 and Range requests get 206 partial content.
+    """
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    # Strong validators must change with the bytes, so the ETag hashes them.
+    st = os.stat(path)
+    etag = _file_etag(path, st.st_mtime_ns, st.st_size)
+    response = send_from_directory(folder, filename, etag=etag, max_age=ARTIFACT_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 @app.route("/processed/<path:filename>")
 def serve_processed(filename):
-    return send_from_directory(PROCESSED_FOLDER, filename)
+    PROCESSED.touch(filename)
+    return send_artifact(PROCESSED_FOLDER, filename)
 
 
 @app.route("/creatives/<path:filename>")
 def serve_creatives(filename):
-    return send_from_directory(CREATIVES_FOLDER, filename)
+    # In lazy mode creatives are rendered the first time they are asked for.
+    if not os.path.exists(os.path.join(CREATIVES_FOLDER, filename)):
+        render_creative(filename)
+    # Creatives are evicted per spec folder, least recently served first.
+    CREATIVES.touch(filename.split("/", 1)[0])
+    return send_artifact(CREATIVES_FOLDER, filename)
 
 
 @app.route("/generate-creatives", methods=["POST"])
@@ -46,50 +172,149 @@ def generate_creatives():
         if not image or not image.filename:
             return jsonify({"error": "image missing"}), 400
 
-        filename = secure_filename(image.filename)
-        upload_path = os.path.join(UPLOAD_FOLDER, filename)
-        image.save(upload_path)
-
-        with Image.open(upload_path) as img:
-            w, h = img.size
-            aspect_ratio = w / h if h else 1.0
+        try:
+            output = parse_output(request.form)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        processed_filename = f"no_bg_{os.path.splitext(filename)[0]}.png"
-        processed_path = os.path.join(PROCESSED_FOLDER, processed_filename)
-
-        remove_background(upload_path, processed_path)
+        base = request.host_url.rstrip("/")
+        return jsonify(run_pipeline(image.read(), image.filename, base, output=output))
 
-        palette = extract_palette(processed_path)
-        colors_hex = [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in palette]
+    except Exception as e:
+        app.logger.exception("generate-creatives failed")
+        return jsonify({"error": str(e)}), 500
 
-        layout = suggest_layout(aspect_ratio, colors_hex)
 
-        text = generate_creative_text(
-            product="Product",
-            category="General",
-            colors=colors_hex,
-        )
+@app.route("/generate-variants", methods=["POST"])
+def generate_variants():
+    """Every creative once per tagline/offer pair in the "variants" JSON field, with a manifest."""
+    try:
+        image = request.files.get("image")
+        if not image or not image.filename:
+            return jsonify({"error": "image missing"}), 400
 
-        creatives = generate_all_creatives(
-            processed_filename,
-            text.get("tagline", "Amazing Deal"),
-            text.get("offer_text", "Limited Offer"),
-            colors_hex,
-        )
+        try:
+            variants = parse_variants(request.form.get("variants", ""))
+            output = parse_output(request.form)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         base = request.host_url.rstrip("/")
-
-        return jsonify({
-            "success": True,
-            "processed_image_url": f"{base}/processed/{processed_filename}",
-            "colors": colors_hex,
-            "layout_suggestions": layout,
-            "creatives": creatives,
-        })
+        return jsonify(run_variants(image.read(), image.filename, base, variants, output=output))
 
     except Exception as e:
+        app.logger.exception("generate-variants failed")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/generate-catalogue", methods=["POST"])
+def generate_catalogue():
+    """
+    Creatives for many products at once, streamed back as a ZIP with a manifest.
+
+    Accepts any number of "images" files and/or "archive" ZIP files.
+    """
+    images = request.files.getlist("images")
+    archives = request.files.getlist("archive")
+    if not any(f.filename for f in images + archives):
+        return jsonify({"error": "images missing"}), 400
+
+    try:
+        output = parse_output(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    body = stream_catalogue(iter_uploads(spool_uploads(images, archives)), output)
+    return Response(
+        body,
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=creatives.zip"},
+    )
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """Queue a /generate-creatives run and return its job id immediately."""
+    image = request.files.get("image")
+    if not image or not image.filename:
+        return jsonify({"error": "image missing"}), 400
+
+    try:
+        output = parse_output(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    base = request.host_url.rstrip("/")
+    try:
+        job = jobs.submit(run_pipeline, image.read(), image.filename, base, output=output)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify({
+        "job_id": job.id,
+        "status_url": f"{base}/jobs/{job.id}",
+        "events_url": f"{base}/jobs/{job.id}/events",
+    }), 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    snapshot = jobs.snapshot(job_id)
+    if not snapshot:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(snapshot)
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    if not jobs.cancel(job_id):
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(jobs.snapshot(job_id)), 202
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """
+    Server-Sent Events stream of a job's stages and creatives as they are rendered.
+
+    Each event carries its index as id, so a client reconnecting with
+    Last-Event-ID resumes after the last event it saw. With
+    ?cancel_on_disconnect=1 the job is cancelled if the client goes away first.
+    """
+    if not jobs.snapshot(job_id):
+        return jsonify({"error": "job not found"}), 404
+
+    cancel_on_disconnect = request.args.get("cancel_on_disconnect") == "1"
+    try:
+        sent = int(request.headers.get("Last-Event-ID", "-1")) + 1
+    except ValueError:
+        sent = 0
+
+    def stream():
+        nonlocal sent
+        done = False
+        try:
+            while True:
+                events, done = jobs.wait_events(job_id, sent, timeout=15)
+                for e in events:
+                    yield f"id: {sent}\nevent: {e['event']}\ndata: {json.dumps(e)}\n\n"
+                    sent += 1
+
+                if done:
+                    return
+                if not events:
+                    yield ": keep-alive\n\n"
+        finally:
+            # A write to a closed connection ends the generator early.
+            if cancel_on_disconnect and not done:
+                jobs.cancel(job_id)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -0,0 +1,262 @@
+"""
+Benchmarks for the templates and pipeline stages.
+
+Renders synthetic RGBA products, so no uploads or models are needed:
+rembg is replaced by a pass-through stub and copy comes from the offline
+"local" backend. Results are written as JSON; pass --compare with an
+earlier file to flag cases whose median got slower.
+
+    python benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw, ImageFilter
+
+os.environ.setdefault("COPY_BACKEND", "local")
+
+# Background removal without onnxruntime or model downloads: the synthetic
+# products already have a transparent backdrop.
+_rembg_stub = types.ModuleType("rembg")
+_rembg_stub.remove = lambda img, session=None, **kwargs: img.convert("RGBA").copy()
+sys.modules["rembg"] = _rembg_stub
+
+from utils import artifacts, background, pipeline, result_cache, templates_engine  # noqa: E402
+from utils.assets import ProductAsset  # noqa: E402
+from utils.colors import extract_palette  # noqa: E402
+from utils.templates_engine import SIZES, TEMPLATES, generate_all_creatives, generate_variants  # noqa: E402
+from utils.validator import simple_validator  # noqa: E402
+
+background._create_session = lambda: None
+
+# Product photos of the shapes and resolutions uploads tend to have.
+FIXTURES = {
+    "square": (800, 800),
+    "portrait": (600, 1000),
+    "landscape": (1200, 700),
+    "large": (2400, 2400),
+}
+
+TAGLINE = "Meet the New Product"
+OFFER = "Limited Offer"
+# Copy variants for the A/B case.
+VARIANTS = [(f"{TAGLINE} {i}", f"{10 + 5 * i}% Off") for i in range(5)]
+COLORS = ["#c9285a", "#14c827", "#e1a3b3", "#9d4e4d", "#2f5d8a"]
+
+# What the app imports before serving; heavy libraries must stay out of it.
+STARTUP_IMPORTS = "import flask, flask_cors, utils.catalogue, utils.jobs, utils.pipeline, utils.templates_engine"
+
+# Slowdowns smaller than this are treated as noise whatever the ratio.
+MIN_REGRESSION_MS = 1.0
+
+
+def synthetic_product(width: int, height: int, seed: int = 0) -> Image.Image:
+    """An RGBA 'product': a shaded, textured rounded body on a transparent backdrop."""
+    rng = np.random.default_rng(seed)
+
+    t = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None, None]
+    top = rng.integers(40, 255, 3).astype(np.float32)
+    bottom = rng.integers(0, 200, 3).astype(np.float32)
+    rgb = top * (1 - t) + bottom * t
+    rgb = np.broadcast_to(rgb, (height, width, 3)) + rng.normal(0, 12, (height, width, 3))
+    img = Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8), "RGB").convert("RGBA")
+
+    mask = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(mask)
+    mx, my = width // 10, height // 10
+    draw.rounded_rectangle((mx, my * 2, width - mx, height - my), radius=min(width, height) // 6, fill=255)
+    draw.ellipse((width // 3, my // 2, width * 2 // 3, my * 3), fill=255)
+    img.putalpha(mask.filter(ImageFilter.GaussianBlur(2)))
+
+    label = ImageDraw.Draw(img)
+    label.rectangle((width // 4, height // 2, width * 3 // 4, height * 2 // 3), fill=(245, 245, 240, 255))
+    return img
+
+
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> dict:
+    """Wall time of fn in ms over repeat runs, after one untimed warm-up run."""
+    if setup:
+        setup()
+    fn()
+
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "median_ms": round(statistics.median(runs), 3),
+        "min_ms": round(min(runs), 3),
+        "mean_ms": round(statistics.fmean(runs), 3),
+        "runs": len(runs),
+    }
+
+
+def run_benchmarks(fixtures, repeat: int, only: Optional[str], workdir: str) -> Dict[str, dict]:
+    results: Dict[str, dict] = {}
+    products = {name: synthetic_product(*FIXTURES[name], seed=i) for i, name in enumerate(fixtures)}
+
+    def case(name: str, fn: Callable[[], object], setup: Optional[Callable[[], None]] = None) -> None:
+        if only and only not in name:
+            return
+        results[name] = measure(fn, repeat, setup)
+        print(f"{name:<55} {results[name]['median_ms']:>10.1f} ms", flush=True)
+
+    # A fresh interpreter each run, so nothing is already imported.
+    case(
+        "startup/import",
+        lambda: subprocess.run(
+            [sys.executable, "-c", STARTUP_IMPORTS],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+        ),
+    )
+
+    for fixture, image in products.items():
+        for template_name, template in TEMPLATES:
+            for size_name, size in SIZES.items():
+                out_path = os.path.join(workdir, f"{template_name}_{size_name}.png")
+                # A fresh asset per run, so the product resize is timed like a first render.
+                case(
+                    f"template/{template.__name__}/{size_name}/{fixture}",
+                    lambda: template(ProductAsset(image), out_path, TAGLINE, OFFER, (201, 40, 90), size),
+                )
+
+        case(f"extract_palette/{fixture}", lambda: extract_palette(image))
+
+        creatives_folder = os.path.join(workdir, "creatives")
+        case(
+            f"generate_all_creatives/{fixture}",
+            lambda: generate_all_creatives(
+                "benchmark.png",
+                TAGLINE,
+                OFFER,
+                COLORS,
+                product=ProductAsset(image),
+                out_folder=creatives_folder,
+            ),
+            # Creatives already on disk are not rendered again, so start from nothing each run.
+            setup=lambda: shutil.rmtree(creatives_folder, ignore_errors=True),
+        )
+
+        case(
+            f"generate_variants/{len(VARIANTS)}/{fixture}",
+            lambda: generate_variants("benchmark.png", VARIANTS, COLORS, product=ProductAsset(image), out_folder=creatives_folder),
+            # A rendered set is reused from its manifest, so start from nothing each run.
+            setup=lambda: shutil.rmtree(creatives_folder, ignore_errors=True),
+        )
+
+        upload = os.path.join(workdir, f"upload_{fixture}.png")
+        image.save(upload)
+        with open(upload, "rb") as f:
+            data = f.read()
+
+        def clear_result_cache() -> None:
+            shutil.rmtree(result_cache.CACHE_FOLDER, ignore_errors=True)
+            os.makedirs(result_cache.CACHE_FOLDER)
+            shutil.rmtree(templates_engine.CREATIVES_FOLDER, ignore_errors=True)
+
+        case(
+            f"run_pipeline/{fixture}",
+            lambda: pipeline.run_pipeline(data, f"{fixture}.png", "http://localhost"),
+            setup=clear_result_cache,
+        )
+
+    for size_name, size in SIZES.items():
+        creative = os.path.join(workdir, f"validate_{size_name}.png")
+        product = ProductAsset(next(iter(products.values())))
+        templates_engine.template_clean_minimal(product, creative, TAGLINE, OFFER, (201, 40, 90), size)
+        regions = templates_engine.creative_regions(product, size_name, "clean", TAGLINE, OFFER, (201, 40, 90))
+        case(f"simple_validator/{size_name}", lambda: simple_validator(creative, regions))
+
+    return results
+
+
+def compare(current: Dict[str, dict], previous: Dict[str, dict], threshold: float) -> list:
+    """Cases whose median grew by more than threshold (a fraction) since previous."""
+    regressions = []
+    for name, result in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        old, new = before["median_ms"], result["median_ms"]
+        if new > old * (1 + threshold) and new - old > MIN_REGRESSION_MS:
+            regressions.append({"case": name, "before_ms": old, "after_ms": new, "change": round(new / old - 1, 3)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="benchmark.json", help="where to write the results JSON")
+    parser.add_argument("--compare", help="earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown (fraction of the median) flagged as a regression")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    parser.add_argument("--fixtures", default=",".join(FIXTURES), help="comma-separated subset of: " + ", ".join(FIXTURES))
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    args = parser.parse_args(argv)
+
+    fixtures = [f for f in args.fixtures.split(",") if f]
+    unknown = set(fixtures) - set(FIXTURES)
+    if unknown:
+        parser.error(f"unknown fixtures: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    # Keep stage outputs out of the app's uploads/, processed/ and creatives/.
+    artifacts.UPLOADS.folder = workdir
+    pipeline.PROCESSED_FOLDER = result_cache.CACHE_FOLDER = artifacts.PROCESSED.folder = os.path.join(workdir, "processed")
+    templates_engine.CREATIVES_FOLDER = artifacts.CREATIVES.folder = os.path.join(workdir, "creatives")
+    os.makedirs(result_cache.CACHE_FOLDER)
+
+    try:
+        results = run_benchmarks(fixtures, max(1, args.repeat), args.only, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "render_workers": templates_engine.RENDER_WORKERS,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        regressions = compare(results, previous.get("results", {}), args.threshold)
+        report["compared_to"] = args.compare
+        report["regressions"] = regressions
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {len(results)} results to {args.output}")
+
+    for r in regressions:
+        print(f"REGRESSION {r['case']}: {r['before_ms']:.1f} -> {r['after_ms']:.1f} ms ({r['change']:+.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+# Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is loaded once in the master (preload_app), so rembg, onnxruntime,
+# the fonts and the rest of the app are shared copy-on-write by the workers.
+# rembg sessions, the render pool and the artifact janitor hold threads, which
+# do not survive a fork, so each worker starts its own in post_fork.
+import os
+import shutil
+import tempfile
+
+CPUS = os.cpu_count() or 1
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+# Processes; renders and background removal run in parallel across them.
+workers = int(os.environ.get("WEB_WORKERS", CPUS))
+# Request threads per process, mostly waiting on render and rembg pools. Each
+# open /jobs/<id>/events stream holds one for as long as the client listens.
+threads = int(os.environ.get("WEB_THREADS", "16"))
+worker_class = "gthread"
+timeout = int(os.environ.get("WEB_TIMEOUT", "120"))
+preload_app = True
+
+# Share the cores between workers instead of each sizing its pools for all of them.
+os.environ.setdefault("RENDER_WORKERS", str(max(1, CPUS // workers)))
+os.environ.setdefault("REMBG_THREADS", str(max(1, CPUS // workers)))
+os.environ["DEFER_BACKGROUND_TASKS"] = "1"
+# Workers share metrics and readiness through this folder, so /metrics and
+# /readyz answer for all of them whichever one serves the request.
+os.environ["WEB_WORKERS"] = str(workers)
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="retailstudio-metrics-"))
+
+
+def post_fork(server, worker):
+    from app import start_background_tasks
+
+    start_background_tasks()
+
+
+def child_exit(server, worker):
+    from utils.metrics import remove_worker_snapshot
+
+    remove_worker_snapshot(worker.pid)
+
+
+def on_exit(server):
+    if os.path.basename(os.environ["METRICS_DIR"]).startswith("retailstudio-metrics-"):
+        shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
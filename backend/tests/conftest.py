@@ -0,0 +1,32 @@
+# Run from backend/: python -m pytest tests
+import os
+import sys
+import tempfile
+
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Set before anything imports utils.jobs or app: jobs go to a scratch
+# database, and importing the app neither warms rembg nor starts the janitor.
+os.environ.setdefault("JOB_DB", os.path.join(tempfile.mkdtemp(prefix="retailstudio-tests-"), "jobs.db"))
+os.environ.setdefault("DEFER_BACKGROUND_TASKS", "1")
+
+
+@pytest.fixture(scope="session")
+def product() -> Image.Image:
+    """A deterministic cut-out: an opaque ellipse with a translucent panel, on transparency."""
+    img = Image.new("RGBA", (900, 1300), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((50, 50, 850, 1250), fill=(200, 40, 90, 255))
+    draw.rectangle((300, 300, 600, 900), fill=(20, 200, 40, 200))
+    return img
+
+
+@pytest.fixture
+def server():
+    """The Flask app module; its test client is server.app.test_client()."""
+    import app
+
+    return app
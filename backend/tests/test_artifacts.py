@@ -0,0 +1,117 @@
+import json
+import os
+import time
+
+import pytest
+
+from utils import templates_engine
+from utils.artifacts import MIN_AGE, PROCESSED, ArtifactStore, _sweep_lock, fcntl
+
+
+def _entry(store: ArtifactStore, name: str, size: int, age: float, now: float) -> None:
+    path = store.path(name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    os.utime(path, (now - age, now - age))
+
+
+def _names(store: ArtifactStore) -> set:
+    return {n for n in os.listdir(store.folder) if not n.startswith(".")}
+
+
+def test_evicts_least_recently_used_beyond_budget(tmp_path):
+    store = ArtifactStore("test", str(tmp_path), max_bytes=2000)
+    now = time.time()
+    for i, age in enumerate([500, 400, 300, 200]):
+        _entry(store, f"e{i}.png", 1000, MIN_AGE + age, now)
+
+    occupancy = store.sweep(now)
+
+    assert _names(store) == {"e2.png", "e3.png"}
+    assert occupancy == {"bytes": 2000, "entries": 2, "max_bytes": 2000}
+
+
+def test_never_evicts_entries_younger_than_min_age(tmp_path):
+    store = ArtifactStore("test", str(tmp_path), max_bytes=0, ttl=1)
+    now = time.time()
+    _entry(store, "old.png", 1000, MIN_AGE + 10, now)
+    _entry(store, "young.png", 1000, MIN_AGE - 10, now)
+
+    store.sweep(now)
+
+    assert _names(store) == {"young.png"}
+
+
+def test_touch_makes_an_entry_recent(tmp_path):
+    store = ArtifactStore("test", str(tmp_path), max_bytes=1000)
+    now = time.time()
+    _entry(store, "a.png", 1000, MIN_AGE + 500, now)
+    _entry(store, "b.png", 1000, MIN_AGE + 100, now)
+
+    store.touch("a.png")
+    store.sweep()
+
+    assert _names(store) == {"a.png"}
+
+
+def test_expires_after_ttl_within_budget(tmp_path):
+    store = ArtifactStore("test", str(tmp_path), max_bytes=10 ** 9, ttl=MIN_AGE + 100)
+    now = time.time()
+    _entry(store, "stale.png", 10, MIN_AGE + 200, now)
+    _entry(store, "fresh.png", 10, MIN_AGE + 50, now)
+
+    store.sweep(now)
+
+    assert _names(store) == {"fresh.png"}
+
+
+def test_kept_entries_survive_eviction(tmp_path):
+    store = ArtifactStore("test", str(tmp_path), max_bytes=0)
+    store.keep(lambda: {"no_bg_a"})
+    now = time.time()
+    _entry(store, "no_bg_a.png", 10, MIN_AGE + 100, now)
+    _entry(store, "no_bg_a.json", 10, MIN_AGE + 100, now)
+    _entry(store, "no_bg_b.png", 10, MIN_AGE + 100, now)
+
+    store.sweep(now)
+
+    assert _names(store) == {"no_bg_a.png", "no_bg_a.json"}
+
+
+def test_spec_folders_are_evicted_whole(tmp_path):
+    store = ArtifactStore("test", str(tmp_path), max_bytes=1500, key=lambda name: name)
+    now = time.time()
+    for spec, age in (("old", 300), ("new", 100)):
+        os.makedirs(store.path(spec))
+        for name in ("a.png", "b.png"):
+            path = os.path.join(store.path(spec), name)
+            with open(path, "wb") as f:
+                f.write(b"x" * 500)
+            os.utime(path, (now - MIN_AGE - age, now - MIN_AGE - age))
+        os.utime(store.path(spec), (now - MIN_AGE - age, now - MIN_AGE - age))
+
+    assert store.sweep(now) == {"bytes": 1000, "entries": 1, "max_bytes": 1500}
+    assert _names(store) == {"new"}
+
+
+@pytest.mark.skipif(fcntl is None, reason="sweeps are only serialised where fcntl exists")
+def test_sweep_is_skipped_while_another_process_sweeps(tmp_path):
+    store = ArtifactStore("test", str(tmp_path), max_bytes=0)
+    _entry(store, "a.png", 10, MIN_AGE + 100, time.time())
+
+    with _sweep_lock(store.folder) as acquired:
+        assert acquired
+        assert store.sweep() is None
+        assert _names(store) == {"a.png"}
+
+    assert store.sweep() == {"bytes": 0, "entries": 0, "max_bytes": 0}
+
+
+def test_lazy_specs_keep_their_source_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(templates_engine, "CREATIVES_FOLDER", str(tmp_path))
+    os.makedirs(tmp_path / "spec1")
+    with open(tmp_path / "spec1" / "spec.json", "w") as f:
+        json.dump({"processed_filename": "no_bg_abc.png"}, f)
+    os.makedirs(tmp_path / "eager")
+
+    assert templates_engine._lazy_sources() == {PROCESSED.key("no_bg_abc.png")}
@@ -0,0 +1,120 @@
+import io
+import json
+import os
+import zipfile
+
+import pytest
+from PIL import Image
+
+from utils import catalogue
+from utils.assets import ProductAsset
+from utils.catalogue import iter_uploads, stream_catalogue
+from utils.templates_engine import SIZES, TEMPLATES
+
+CREATIVES_PER_SKU = len(SIZES) * len(TEMPLATES)
+
+
+def _png(color) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGBA", (120, 160), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Stands in for background removal and copy; records every upload it processes."""
+    seen = []
+
+    def process_upload(data, filename):
+        if filename.startswith("broken"):
+            raise ValueError("cannot identify image file")
+        seen.append(filename)
+        img = Image.open(io.BytesIO(data)).convert("RGBA")
+        return {
+            "processed_filename": f"no_bg_{filename}.png",
+            "palette": [img.getpixel((0, 0))[:3]],
+            "product": ProductAsset(img),
+        }
+
+    monkeypatch.setattr(catalogue, "process_upload", process_upload)
+    monkeypatch.setattr(
+        catalogue, "generate_creative_text", lambda **kw: {"tagline": "Fresh", "offer_text": "2 for 1"}
+    )
+    return seen
+
+
+def _read_zip(chunks) -> zipfile.ZipFile:
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+def test_zip_holds_every_creative_and_a_manifest(processed):
+    uploads = [("red.png", _png((200, 0, 0, 255))), ("blue.png", _png((0, 0, 200, 255)))]
+
+    zf = _read_zip(stream_catalogue(iter(uploads), workers=2))
+    manifest = json.loads(zf.read("manifest.json"))["items"]
+
+    assert sorted(item["name"] for item in manifest) == ["blue.png", "red.png"]
+    for item in manifest:
+        assert item["tagline"] == "Fresh" and item["offer"] == "2 for 1"
+        assert len(item["files"]) == CREATIVES_PER_SKU
+        for arcname in item["files"].values():
+            assert arcname.startswith(f"{item['name'][:-4]}-{item['digest'][:8]}/")
+            with Image.open(zf.open(arcname)) as img:
+                assert img.size in SIZES.values()
+    assert len(zf.namelist()) == 2 * CREATIVES_PER_SKU + 1
+
+
+def test_identical_images_are_rendered_once(processed):
+    red = _png((200, 0, 0, 255))
+    uploads = [("red.png", red), ("green.png", _png((0, 200, 0, 255))), ("red-copy.png", red)]
+
+    zf = _read_zip(stream_catalogue(iter(uploads), workers=2))
+    manifest = {item["name"]: item for item in json.loads(zf.read("manifest.json"))["items"]}
+
+    assert sorted(processed) == ["green.png", "red.png"]
+    assert manifest["red-copy.png"]["duplicate_of"] == "red.png"
+    assert manifest["red-copy.png"]["digest"] == manifest["red.png"]["digest"]
+    assert len(zf.namelist()) == 2 * CREATIVES_PER_SKU + 1
+
+
+def test_failed_product_is_reported_without_stopping_the_rest(processed):
+    uploads = [("broken.png", b"not an image"), ("red.png", _png((200, 0, 0, 255)))]
+
+    zf = _read_zip(stream_catalogue(iter(uploads), workers=1))
+    manifest = {item["name"]: item for item in json.loads(zf.read("manifest.json"))["items"]}
+
+    assert manifest["broken.png"]["error"] == "cannot identify image file"
+    assert len(manifest["red.png"]["files"]) == CREATIVES_PER_SKU
+
+
+def test_uploads_are_read_from_images_and_zip_archives(tmp_path):
+    folder = tmp_path / "spool"
+    folder.mkdir()
+    (folder / "000000_single.png").write_bytes(b"single")
+    with zipfile.ZipFile(folder / "000001_pack.zip", "w") as zf:
+        zf.writestr("pack/a.jpg", b"a")
+        zf.writestr("pack/notes.txt", b"skip")
+        zf.writestr("pack/nested/", b"")
+        zf.writestr("pack/nested/b.WEBP", b"b")
+
+    assert list(iter_uploads(str(folder))) == [("single.png", b"single"), ("a.jpg", b"a"), ("b.WEBP", b"b")]
+    assert not os.path.exists(folder)
+
+
+def test_catalogue_endpoint_streams_the_zip(processed, server):
+    client = server.app.test_client()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("blue.png", _png((0, 0, 200, 255)))
+    archive.seek(0)
+
+    response = client.post("/generate-catalogue", data={
+        "images": [(io.BytesIO(_png((200, 0, 0, 255))), "red.png")],
+        "archive": [(archive, "pack.zip")],
+    })
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+    manifest = json.loads(zipfile.ZipFile(io.BytesIO(response.data)).read("manifest.json"))["items"]
+    assert sorted(item["name"] for item in manifest) == ["blue.png", "red.png"]
+    assert client.post("/generate-catalogue", data={}).status_code == 400
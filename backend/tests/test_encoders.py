@@ -0,0 +1,89 @@
+import os
+
+import pytest
+from PIL import Image, features
+
+from utils.encoders import DEFAULT_OUTPUT, OutputFormat, parse_output, save_canvas, thumbnail_path
+
+
+def test_parse_output_reads_request_fields():
+    output = parse_output({"format": "JPG", "quality": "70", "optimize": "true", "thumbnail": "256"})
+
+    assert output == OutputFormat("jpeg", 70, True, 256)
+    assert output.extension == "jpg"
+
+
+def test_parse_output_defaults_missing_fields():
+    default = OutputFormat("webp", 60, False, 128)
+
+    assert parse_output({}, default) == default
+    assert parse_output({"format": "png"}, default) == OutputFormat("png", 60, False, 128)
+    assert parse_output({"thumbnail": "-5"}, DEFAULT_OUTPUT).thumbnail == 0
+
+
+@pytest.mark.parametrize("fields", [
+    {"format": "gif"},
+    {"quality": "0"},
+    {"quality": "101"},
+    {"quality": "high"},
+    {"thumbnail": "big"},
+])
+def test_parse_output_rejects_bad_fields(fields):
+    with pytest.raises(ValueError):
+        parse_output(fields)
+
+
+@pytest.mark.parametrize("fmt", ["webp", "avif"])
+def test_parse_output_rejects_formats_the_server_cannot_encode(fmt, monkeypatch):
+    monkeypatch.setattr(features, "check", lambda name: False)
+
+    with pytest.raises(ValueError, match="not available"):
+        parse_output({"format": fmt})
+
+
+@pytest.mark.parametrize("fmt", ["png", "webp", "jpeg", "avif"])
+def test_save_canvas_writes_the_requested_format(fmt, tmp_path):
+    if fmt in ("webp", "avif") and not features.check(fmt):
+        pytest.skip(f"Pillow was built without {fmt}")
+    output = OutputFormat(fmt)
+    path = str(tmp_path / f"out.{output.extension}")
+
+    save_canvas(Image.new("RGBA", (64, 48), (10, 200, 30, 255)), path, output)
+
+    with Image.open(path) as img:
+        assert img.format == fmt.upper()
+        assert img.size == (64, 48)
+    assert [n for n in os.listdir(tmp_path) if n.endswith(".tmp")] == []
+
+
+def test_opaque_canvas_is_written_without_alpha(tmp_path):
+    path = str(tmp_path / "out.png")
+
+    encoded = save_canvas(Image.new("RGBA", (32, 32), (1, 2, 3, 255)), path, OutputFormat("png"))
+
+    assert encoded.mode == "RGB"
+    with Image.open(path) as img:
+        assert img.mode == "RGB"
+
+
+def test_transparency_is_kept_in_png_and_flattened_onto_white_in_jpeg(tmp_path):
+    canvas = Image.new("RGBA", (32, 32), (0, 0, 0, 0))
+    canvas.paste((200, 0, 0, 255), (0, 0, 16, 32))
+
+    png = save_canvas(canvas, str(tmp_path / "out.png"), OutputFormat("png"))
+    jpeg = save_canvas(canvas, str(tmp_path / "out.jpg"), OutputFormat("jpeg", quality=100))
+
+    assert png.mode == "RGBA"
+    assert jpeg.mode == "RGB"
+    assert jpeg.getpixel((24, 16)) == (255, 255, 255)
+    assert jpeg.getpixel((8, 16)) == (200, 0, 0)
+
+
+def test_thumbnail_is_written_beside_the_creative(tmp_path):
+    path = str(tmp_path / "square_clean.png")
+
+    save_canvas(Image.new("RGB", (1080, 540), (9, 9, 9)), path, OutputFormat("png", thumbnail=200))
+
+    assert thumbnail_path(path) == str(tmp_path / "square_clean_thumb.png")
+    with Image.open(thumbnail_path(path)) as thumb:
+        assert thumb.size == (200, 100)
@@ -0,0 +1,41 @@
+import pytest
+from PIL import ImageFont
+
+from utils import layouts
+
+
+def _truetype_available(name: str) -> bool:
+    try:
+        ImageFont.truetype(name, 12)
+    except OSError:
+        return False
+    return True
+
+
+@pytest.fixture(scope="module")
+def ttf() -> str:
+    for name in ("arial.ttf", "DejaVuSans.ttf"):
+        if _truetype_available(name):
+            return name
+    pytest.skip("no TrueType font installed")
+
+
+def _linear_font_size(text, max_width, max_height, font_path, start_size=80, min_size=12) -> int:
+    # The original search: step down by 2 until the text fits.
+    for size in range(start_size, min_size - 1, -2):
+        bbox = ImageFont.truetype(font_path, size).getbbox(text)
+        if bbox[2] - bbox[0] <= max_width and bbox[3] - bbox[1] <= max_height:
+            return size
+    return min_size
+
+
+@pytest.mark.parametrize("text", ["50% OFF", "Fresh Summer Deals", "Limited-time deal. Hurry up!", "W", ""])
+@pytest.mark.parametrize("box", [(1000, 200), (400, 160), (200, 40), (120, 120), (30, 30), (5, 5)])
+def test_font_size_search_matches_linear_scan(text, box, ttf):
+    font = layouts.auto_font_size(text, box[0], box[1], font_path=ttf)
+
+    assert font.size == _linear_font_size(text, box[0], box[1], ttf)
+
+
+def test_fonts_are_loaded_once_per_path_and_size(ttf):
+    assert layouts.load_font(ttf, 40) is layouts.load_font(ttf, 40)
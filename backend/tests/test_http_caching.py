@@ -0,0 +1,98 @@
+import hashlib
+import os
+
+import pytest
+
+from utils import pipeline, templates_engine
+from utils.encoders import OutputFormat
+from utils.result_cache import content_hash
+
+SPEC = "0123456789abcdef0123456789abcdef"
+BODY = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def client(server, tmp_path, monkeypatch):
+    """Test client serving creatives/ and processed/ from scratch folders holding one file each."""
+    for folder, attr in (("creatives", "CREATIVES_FOLDER"), ("processed", "PROCESSED_FOLDER")):
+        os.makedirs(tmp_path / folder)
+        monkeypatch.setattr(server, attr, str(tmp_path / folder))
+    os.makedirs(tmp_path / "creatives" / SPEC)
+    (tmp_path / "creatives" / SPEC / "square_clean.png").write_bytes(BODY)
+    (tmp_path / "processed" / "no_bg_abc.png").write_bytes(BODY)
+    return server.app.test_client()
+
+
+def test_artifacts_are_immutable_with_a_content_etag(client):
+    for url in (f"/creatives/{SPEC}/square_clean.png", "/processed/no_bg_abc.png"):
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert response.data == BODY
+        assert response.headers["ETag"] == f'"{hashlib.sha256(BODY).hexdigest()[:32]}"'
+        cache_control = response.cache_control
+        assert cache_control.public and cache_control.immutable
+        assert cache_control.max_age == 365 * 24 * 3600
+
+
+def test_matching_etag_gets_not_modified(client):
+    url = f"/creatives/{SPEC}/square_clean.png"
+    etag = client.get(url).headers["ETag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.data == b""
+    assert client.get(url, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_range_requests_get_partial_content(client):
+    url = f"/creatives/{SPEC}/square_clean.png"
+    etag = client.get(url).headers["ETag"]
+
+    response = client.get(url, headers={"Range": "bytes=100-199"})
+    resumed = client.get(url, headers={"Range": "bytes=10000-", "If-Range": etag})
+    stale = client.get(url, headers={"Range": "bytes=10000-", "If-Range": '"stale"'})
+
+    assert response.status_code == 206
+    assert response.data == BODY[100:200]
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(BODY)}"
+    assert resumed.status_code == 206 and resumed.data == BODY[10000:]
+    assert stale.status_code == 200 and stale.data == BODY
+
+
+def test_rewritten_file_gets_a_new_etag(client, tmp_path):
+    url = f"/creatives/{SPEC}/square_clean.png"
+    before = client.get(url).headers["ETag"]
+    path = tmp_path / "creatives" / SPEC / "square_clean.png"
+    path.write_bytes(BODY[::-1] + b"!")
+
+    assert client.get(url).headers["ETag"] != before
+
+
+@pytest.mark.parametrize("url", [
+    f"/creatives/{SPEC}/square_missing.png",
+    "/creatives/../app.py",
+    f"/creatives/{SPEC}",
+    "/processed/no_bg_missing.png",
+])
+def test_missing_and_outside_paths_are_not_found(client, url):
+    assert client.get(url).status_code == 404
+
+
+def test_urls_change_with_every_setting_that_changes_the_bytes(monkeypatch):
+    args = ("no_bg_abc.png", "Fresh", "50% OFF", (1, 2, 3))
+    spec = templates_engine.render_spec_id(*args)
+
+    assert templates_engine.render_spec_id(*args) == spec
+    assert templates_engine.render_spec_id(*args, OutputFormat("webp")) != spec
+    assert templates_engine.render_spec_id("no_bg_abc.png", "Fresh", "50% OFF", (1, 2, 4)) != spec
+    monkeypatch.setattr(templates_engine, "PNG_COMPRESS_LEVEL", 9)
+    assert templates_engine.render_spec_id(*args) != spec
+    monkeypatch.setattr(templates_engine, "RENDER_VERSION", templates_engine.RENDER_VERSION + 1)
+    assert templates_engine.render_spec_id(*args) != spec
+
+    digest = pipeline.upload_digest(b"image")
+    assert digest != content_hash(b"image")
+    monkeypatch.setattr(pipeline, "WORKING_MAX_SIDE", pipeline.WORKING_MAX_SIDE + 1)
+    assert pipeline.upload_digest(b"image") != digest
@@ -0,0 +1,194 @@
+import threading
+import time
+
+import pytest
+
+from utils.jobs import FINISHED, JobManager, JobStore, QueueFull
+
+
+@pytest.fixture
+def store(tmp_path) -> JobStore:
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def _wait_finished(manager: JobManager, job_id: str, timeout: float = 10) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snapshot = manager.snapshot(job_id)
+        if snapshot["status"] in FINISHED:
+            return snapshot
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def _stages(emit, cancel):
+    for stage in ("upload", "render"):
+        emit("stage", stage=stage)
+    emit("creative", file="square_clean.png")
+    return {"ok": True}
+
+
+def test_events_are_numbered_in_order_and_replayed_from_any_index(store):
+    store.create("j")
+    for i in range(5):
+        store.append("j", {"event": "stage", "stage": f"s{i}"})
+
+    assert [e["stage"] for e in store.events("j")] == ["s0", "s1", "s2", "s3", "s4"]
+    assert [e["stage"] for e in store.events("j", since=3)] == ["s3", "s4"]
+    assert store.row("j")["stage"] == "s4"
+
+
+def test_finishing_event_and_status_are_written_together(store):
+    store.create("j")
+    store.append("j", {"event": "done", "result": {"n": 1}}, "done", result={"n": 1})
+
+    assert store.row("j") == {"status": "done", "stage": None, "result": {"n": 1}, "error": None}
+    assert store.events("j")[-1]["event"] == "done"
+
+
+def test_job_runs_to_done_with_its_events(store):
+    manager = JobManager(workers=1, store=store)
+    job = manager.submit(_stages)
+
+    snapshot = _wait_finished(manager, job.id)
+
+    assert snapshot["status"] == "done"
+    assert snapshot["result"] == {"ok": True}
+    assert snapshot["creatives"] == [{"event": "creative", "file": "square_clean.png"}]
+    assert [e["event"] for e in store.events(job.id)] == ["queued", "stage", "stage", "creative", "done"]
+
+
+def test_errors_finish_the_job(store):
+    def fail(emit, cancel):
+        raise RuntimeError("boom")
+
+    manager = JobManager(workers=1, store=store)
+    snapshot = _wait_finished(manager, manager.submit(fail).id)
+
+    assert snapshot["status"] == "error"
+    assert snapshot["error"] == "boom"
+
+
+def test_cancel_stops_a_running_job(store):
+    started = threading.Event()
+
+    def until_cancelled(emit, cancel):
+        started.set()
+        assert cancel.wait(10)
+        raise RuntimeError("cancelled")
+
+    manager = JobManager(workers=1, store=store)
+    job = manager.submit(until_cancelled)
+    assert started.wait(10)
+
+    assert manager.cancel(job.id)
+    assert _wait_finished(manager, job.id)["status"] == "cancelled"
+    assert not manager.cancel("unknown")
+
+
+def test_cancel_from_another_process_reaches_the_job(tmp_path):
+    # Two stores on one database stand in for two worker processes.
+    manager = JobManager(workers=1, store=JobStore(str(tmp_path / "jobs.db")))
+    other = JobManager(workers=1, store=JobStore(str(tmp_path / "jobs.db")))
+    started = threading.Event()
+
+    def until_cancelled(emit, cancel):
+        started.set()
+        while not cancel.is_set():
+            emit("stage", stage="render")
+            time.sleep(0.01)
+        raise RuntimeError("cancelled")
+
+    job = manager.submit(until_cancelled)
+    assert started.wait(10)
+
+    assert other.cancel(job.id)
+    assert _wait_finished(other, job.id)["status"] == "cancelled"
+
+
+def test_queued_job_cancelled_before_it_starts(store):
+    release = threading.Event()
+    manager = JobManager(workers=1, store=store)
+    blocker = manager.submit(lambda emit, cancel: release.wait(10))
+    queued = manager.submit(_stages)
+
+    manager.cancel(queued.id)
+    release.set()
+
+    assert _wait_finished(manager, blocker.id)["status"] == "done"
+    assert _wait_finished(manager, queued.id)["status"] == "cancelled"
+    assert [e["event"] for e in store.events(queued.id)] == ["queued", "cancelled"]
+
+
+def test_full_queue_rejects_and_forgets_the_job(store):
+    release = threading.Event()
+    manager = JobManager(workers=1, queue_size=1, store=store)
+    running = manager.submit(lambda emit, cancel: release.wait(10))
+    while manager.snapshot(running.id)["status"] != "running":
+        time.sleep(0.01)
+    manager.submit(_stages)
+
+    with pytest.raises(QueueFull):
+        manager.submit(_stages)
+    release.set()
+
+
+def test_wait_events_returns_new_events_and_completion(store):
+    release = threading.Event()
+
+    def gated(emit, cancel):
+        emit("stage", stage="upload")
+        release.wait(10)
+        return {}
+
+    manager = JobManager(workers=1, store=store)
+    job = manager.submit(gated)
+
+    events, done = manager.wait_events(job.id, 0, timeout=5)
+    assert events[0]["event"] == "queued" and not done
+
+    release.set()
+    seen = len(events)
+    while not done:
+        events, done = manager.wait_events(job.id, seen, timeout=5)
+        seen += len(events)
+    assert store.events(job.id)[-1]["event"] == "done"
+
+
+def _sse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((int(fields["id"]), fields["event"]))
+    return events
+
+
+def test_event_stream_resumes_after_last_event_id(server):
+    job = server.jobs.submit(_stages)
+    _wait_finished(server.jobs, job.id)
+    client = server.app.test_client()
+
+    full = _sse(client.get(f"/jobs/{job.id}/events").get_data(as_text=True))
+    resumed = _sse(client.get(f"/jobs/{job.id}/events", headers={"Last-Event-ID": "2"}).get_data(as_text=True))
+
+    assert full == [(0, "queued"), (1, "stage"), (2, "stage"), (3, "creative"), (4, "done")]
+    assert resumed == full[3:]
+
+
+def test_delete_cancels_a_job_over_http(server):
+    started = threading.Event()
+
+    def until_cancelled(emit, cancel):
+        started.set()
+        assert cancel.wait(10)
+        raise RuntimeError("cancelled")
+
+    job = server.jobs.submit(until_cancelled)
+    assert started.wait(10)
+    client = server.app.test_client()
+
+    assert client.delete(f"/jobs/{job.id}").status_code == 202
+    assert _wait_finished(server.jobs, job.id)["status"] == "cancelled"
+    assert client.delete("/jobs/unknown").status_code == 404
+    assert client.get("/jobs/unknown/events").status_code == 404
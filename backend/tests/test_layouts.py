@@ -0,0 +1,68 @@
+import hashlib
+
+import pytest
+from PIL import ImageFont, features
+import PIL
+
+from utils import layouts
+from utils.templates_engine import SIZES
+
+# sha256 of the RGBA pixels of each template rendered from the conftest
+# product. All but diagonal_split equal the renders of the original
+# per-template code; diagonal_split now shows the copy it used to draw on a
+# discarded canvas. Rendered with Pillow 12.0.0, FreeType 2.14.1 and no
+# arial.ttf installed, so text falls back to Pillow's default font.
+GOLDEN_ENV = ("12.0.0", "2.14.1")
+GOLDENS = {
+    ("clean_minimal", "square"): "754f025e5c743b764a29756fa5eb1f86",
+    ("split_layout", "square"): "d038dbc6054ee5bd744e26471ac39e43",
+    ("hero_badge", "square"): "430b8915cf1136b16ad736f93e56709d",
+    ("gradient_glow", "square"): "cf0dd6908121e1997532ec8961460615",
+    ("neon_badge", "square"): "6e1e311db826f4d5b1cdcb0c12c27bcb",
+    ("diagonal_split", "square"): "baa38ef8e7c9a7cedcba415e3673f0f3",
+    ("clean_minimal", "portrait"): "9482af8d9f1c4cbe9eec3b758bd160f6",
+    ("split_layout", "portrait"): "b74ac073db0cead370586121544429c9",
+    ("hero_badge", "portrait"): "8e09e0f30d7bc58c27ea8095c8d4d528",
+    ("gradient_glow", "portrait"): "67d593f19091947295d2c27d97aad90f",
+    ("neon_badge", "portrait"): "24ce5b016c69322d51f8107740472321",
+    ("diagonal_split", "portrait"): "299e667aba50796867ec606785e7323e",
+    ("clean_minimal", "landscape"): "b26b958837563c20ec2677502a75cd72",
+    ("split_layout", "landscape"): "1c16a31b98cac30bc25494c377df9df3",
+    ("hero_badge", "landscape"): "10177b0fae7938144bdd4b8030233426",
+    ("gradient_glow", "landscape"): "d6afd05260d6cce4f1005341892cc694",
+    ("neon_badge", "landscape"): "7307e37b68db1e61d35cc88e4f7d23a6",
+    ("diagonal_split", "landscape"): "c2e9dd8f49a8c428b447bedbcbc4a837",
+}
+
+
+def _truetype_available(name: str) -> bool:
+    try:
+        ImageFont.truetype(name, 12)
+    except OSError:
+        return False
+    return True
+
+
+@pytest.mark.skipif(
+    (PIL.__version__, features.version("freetype2")) != GOLDEN_ENV or _truetype_available("arial.ttf"),
+    reason="goldens were rendered with another Pillow, FreeType or font",
+)
+@pytest.mark.parametrize("template,size_name", sorted(GOLDENS))
+def test_template_matches_golden(template, size_name, product, tmp_path):
+    render = getattr(layouts, f"template_{template}")
+    img = render(product, str(tmp_path / "out.png"), "Fresh Summer Deals", "50% OFF", (230, 120, 40), SIZES[size_name])
+
+    assert hashlib.sha256(img.convert("RGBA").tobytes()).hexdigest()[:32] == GOLDENS[template, size_name]
+
+
+@pytest.mark.parametrize("template", ["split_layout", "gradient_glow", "neon_badge", "diagonal_split"])
+def test_static_layers_are_reused_without_changing_the_render(template, product, tmp_path):
+    render = getattr(layouts, f"template_{template}")
+    color = (12, 34, 56)
+    first = render(product, str(tmp_path / "a.png"), "Fresh Summer Deals", "50% OFF", color, SIZES["portrait"])
+    hits = layouts.static_layers.cache_info().hits
+
+    second = render(product, str(tmp_path / "b.png"), "Fresh Summer Deals", "50% OFF", color, SIZES["portrait"])
+
+    assert layouts.static_layers.cache_info().hits > hits
+    assert first.tobytes() == second.tobytes()
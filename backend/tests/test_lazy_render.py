@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from utils import templates_engine as engine
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch, product):
+    processed = tmp_path / "processed"
+    creatives = tmp_path / "creatives"
+    processed.mkdir()
+    creatives.mkdir()
+    product.save(processed / "no_bg_test.png")
+    monkeypatch.setattr(engine, "PROCESSED_FOLDER", str(processed))
+    monkeypatch.setattr(engine, "CREATIVES_FOLDER", str(creatives))
+    engine._lazy_product.cache_clear()
+    yield tmp_path
+    engine._lazy_product.cache_clear()
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Counts template renders; each is slowed down so concurrent requests overlap."""
+    calls = []
+
+    def counted(name, template):
+        def render(*args, **kwargs):
+            calls.append(name)
+            time.sleep(0.05)
+            return template(*args, **kwargs)
+        return render
+
+    monkeypatch.setattr(engine, "TEMPLATES", tuple((name, counted(name, t)) for name, t in engine.TEMPLATES))
+    return calls
+
+
+def _lazy_spec(on_render=None) -> list:
+    return engine.generate_all_creatives(
+        "no_bg_test.png", "Fresh Summer Deals", "50% OFF", ["#e67828"], lazy=True, on_render=on_render
+    )
+
+
+def test_lazy_mode_records_the_spec_and_renders_nothing(folders, renders):
+    announced = []
+    results = _lazy_spec(lambda *item: announced.append(item))
+
+    spec_id = results[0]["clean_template"].split("/")[0]
+    assert os.listdir(folders / "creatives" / spec_id) == ["spec.json"]
+    assert len(announced) == len(engine.SIZES) * len(engine.TEMPLATES)
+    assert renders == []
+
+
+def test_first_request_renders_the_same_pixels_as_eager_mode(folders, renders):
+    filename = _lazy_spec()[0]["neon_template"]
+    eager = engine.generate_all_creatives(
+        "no_bg_test.png", "Fresh Summer Deals", "50% OFF", ["#e67828"], out_folder=str(folders / "eager")
+    )
+
+    assert engine.render_creative(filename)
+    with Image.open(folders / "creatives" / filename) as lazy, Image.open(folders / "eager" / eager[0]["neon_template"]) as ref:
+        assert lazy.tobytes() == ref.tobytes()
+
+
+def test_concurrent_requests_share_one_render(folders, renders):
+    filename = _lazy_spec()[0]["hero_template"]
+    renders.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(engine.render_creative(filename))) for _ in range(8)]
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [True] * 8
+    assert renders == ["hero"]
+    assert engine._inflight == {}
+
+
+def test_rendered_creative_is_not_rendered_again(folders, renders):
+    filename = _lazy_spec()[0]["clean_template"]
+    engine.render_creative(filename)
+    renders.clear()
+
+    assert engine.render_creative(filename)
+    assert renders == []
+
+
+def test_unknown_creatives_are_not_rendered(folders, renders):
+    spec_id = _lazy_spec()[0]["clean_template"].split("/")[0]
+
+    assert not engine.render_creative("0" * 32 + "/square_clean.png")
+    assert not engine.render_creative(f"{spec_id}/huge_clean.png")
+    assert not engine.render_creative(f"{spec_id}/square_clean.webp")
+    assert not engine.render_creative(f"../{spec_id}/square_clean.png")
+    assert renders == []
+
+
+def test_missing_source_image_is_not_an_error(folders, renders):
+    filename = _lazy_spec()[0]["clean_template"]
+    os.remove(folders / "processed" / "no_bg_test.png")
+
+    assert not engine.render_creative(filename)
+
+
+def test_creatives_route_renders_on_first_get(folders, renders, server, monkeypatch):
+    monkeypatch.setattr(server, "CREATIVES_FOLDER", engine.CREATIVES_FOLDER)
+    filename = _lazy_spec()[0]["split_template"]
+
+    response = server.app.test_client().get(f"/creatives/{filename}")
+
+    assert response.status_code == 200
+    assert response.data == (folders / "creatives" / filename).read_bytes()
+    assert renders == ["split"]
+    assert server.app.test_client().get(f"/creatives/{filename[:-4]}.gif").status_code == 404
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils import metrics
+from utils.metrics import Counter, Histogram, Registry
+
+
+def test_exposition_format():
+    registry = Registry()
+    hits = registry.register(Counter("demo_hits_total", "Hits."))
+    latency = registry.register(Histogram("demo_seconds", "Latency.", buckets=(0.1, 1.0)))
+    hits.inc(cache="a", result="hit")
+    hits.inc(2, cache="a", result="hit")
+    latency.observe(0.05, stage="x")
+    latency.observe(0.5, stage="x")
+    latency.observe(5, stage="x")
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_hits_total Hits.",
+        "# TYPE demo_hits_total counter",
+        'demo_hits_total{cache="a",result="hit"} 3',
+        "# HELP demo_seconds Latency.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{stage="x",le="0.1"} 1',
+        'demo_seconds_bucket{stage="x",le="1.0"} 2',
+        'demo_seconds_bucket{stage="x",le="+Inf"} 3',
+        'demo_seconds_sum{stage="x"} 5.55',
+        'demo_seconds_count{stage="x"} 3',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("demo_total", "Demo.")
+    counter.inc(name='say "hi"\\')
+
+    assert counter.samples() == ['demo_total{name="say \\"hi\\"\\\\"} 1']
+
+
+def test_timed_records_latency_errors_and_request_timings():
+    token = metrics.start_request_timings()
+    with metrics.timed("test_ok"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.timed("test_fail"):
+            raise ValueError
+    timings = metrics.finish_request_timings(token)
+
+    assert [name for name, _ in timings] == ["test_ok", "test_fail"]
+    assert metrics.STAGE_ERRORS.snapshot()[(("stage", "test_fail"),)] >= 1
+    assert "test_ok" in {dict(k)["stage"] for k in metrics.STAGE_SECONDS._values}
+
+
+def test_timings_from_pool_threads_reach_the_request():
+    token = metrics.start_request_timings()
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(metrics.bind_context(metrics.timed_fn("test_worker")(lambda i: i)), range(3)))
+        pool.submit(metrics.timed_fn("test_unbound")(lambda: None)).result()
+    timings = metrics.finish_request_timings(token)
+
+    assert [name for name, _ in timings] == ["test_worker"] * 3
+
+
+def test_server_timing_sums_repeated_stages():
+    header = metrics.server_timing_header([("render", 0.010), ("upload", 0.002), ("render", 0.0205)], 0.05)
+
+    assert header == "render;dur=30.5, upload;dur=2.0, total;dur=50.0"
+
+
+def test_lru_caches_are_reported_as_cache_requests():
+    from functools import lru_cache
+
+    @lru_cache(maxsize=2)
+    def square(x):
+        return x * x
+
+    metrics.register_lru("test_square", square)
+    square(2), square(2), square(3)
+
+    text = metrics.REGISTRY.render()
+    assert f'{metrics.PREFIX}_cache_requests_total{{cache="test_square",result="hit"}} 1' in text
+    assert f'{metrics.PREFIX}_cache_requests_total{{cache="test_square",result="miss"}} 2' in text
+
+
+def test_render_all_merges_live_workers_and_drops_exited_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    live = os.getppid()
+    family = [f"{metrics.PREFIX}_http_in_flight", "HTTP requests being served.", "gauge"]
+    for pid in (live, exited.pid):
+        with open(tmp_path / f"{pid}.json", "w") as f:
+            json.dump({"families": [family + [[f'{family[0]}{{worker="{pid}"}} 7']]], "state": {"ready": True}}, f)
+
+    metrics.cache_result("test_merge", True)
+    text = metrics.render_all()
+
+    assert f'{family[0]}{{worker="{live}"}} 7' in text
+    assert f'{metrics.PREFIX}_cache_requests_total{{worker="{os.getpid()}",cache="test_merge",result="hit"}} 1' in text
+    assert str(exited.pid) not in text
+    assert text.count(f"# TYPE {family[0]} gauge") == 1
+    assert set(metrics.worker_states({"ready": False})) == {live, os.getpid()}
+    assert not (tmp_path / f"{exited.pid}.json").exists()
+
+
+def test_responses_carry_server_timing_and_metrics_are_served(server):
+    client = server.app.test_client()
+
+    response = client.get("/healthz")
+    exposition = client.get("/metrics")
+
+    assert response.headers["Server-Timing"].startswith("total;dur=")
+    assert exposition.mimetype == "text/plain"
+    assert f'{metrics.PREFIX}_http_request_seconds_count{{endpoint="healthz"}}' in exposition.get_data(as_text=True)
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from utils.pipeline import Cancelled, StageGraph
+
+
+def test_stages_run_after_their_dependencies_with_their_results():
+    order = []
+    lock = threading.Lock()
+
+    def stage(name, value):
+        def run(**deps):
+            with lock:
+                order.append(name)
+            return value + sum(deps.values())
+        return run
+
+    graph = StageGraph()
+    graph.add("d", stage("d", 1000), ("b", "c"))
+    graph.add("a", stage("a", 1))
+    graph.add("b", stage("b", 10), ("a",))
+    graph.add("c", stage("c", 100), ("a",))
+
+    results = graph.run()
+
+    assert results == {"a": 1, "b": 11, "c": 101, "d": 1112}
+    assert order[0] == "a" and order[-1] == "d"
+    assert set(graph.timings) == {"a", "b", "c", "d"}
+
+
+def test_independent_stages_overlap():
+    barrier = threading.Barrier(2, timeout=5)
+    graph = StageGraph()
+    # Each waits for the other, so this only finishes if they run at once.
+    graph.add("left", barrier.wait)
+    graph.add("right", barrier.wait)
+
+    assert set(graph.run()) == {"left", "right"}
+
+
+def test_stage_errors_propagate_and_stop_dependents():
+    ran = []
+    graph = StageGraph()
+    graph.add("boom", lambda: 1 / 0)
+    graph.add("after", lambda boom: ran.append("after"), ("boom",))
+
+    with pytest.raises(ZeroDivisionError):
+        graph.run()
+    assert ran == []
+    assert graph.cancel.is_set()
+
+
+def test_cancel_stops_before_the_next_stage():
+    cancel = threading.Event()
+    ran = []
+
+    def first():
+        cancel.set()
+        return 1
+
+    graph = StageGraph(cancel=cancel)
+    graph.add("first", first)
+    graph.add("second", lambda first: ran.append("second"), ("first",))
+
+    with pytest.raises(Cancelled):
+        graph.run()
+    assert ran == []
+
+
+def test_unsatisfiable_dependencies_are_reported():
+    graph = StageGraph()
+    graph.add("orphan", lambda missing: None, ("missing",))
+
+    with pytest.raises(ValueError, match="orphan"):
+        graph.run()
+
+
+def test_stage_events_are_emitted_in_order():
+    events = []
+    graph = StageGraph(emit=lambda event, **data: events.append((event, data["stage"])))
+    graph.add("a", lambda: time.sleep(0.01))
+    graph.add("b", lambda a: None, ("a",))
+    graph.run()
+
+    assert events == [("stage", "a"), ("stage_done", "a"), ("stage", "b"), ("stage_done", "b")]
@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from utils import text_gen
+from utils.metrics import COPY_FALLBACKS
+from utils.text_gen import FALLBACK_COPY, CopyBackend, generate_creative_text, parse_copy
+
+COPY = {"tagline": "Fresh Deals", "short_caption": "Now in store.", "offer_text": "2 for 1", "seo_keywords": ["deal"]}
+
+
+class Scripted(CopyBackend):
+    """Counts its calls; each waits delay seconds, then fails with error or replies with reply."""
+
+    def __init__(self, name, reply=COPY, delay=0.0, error=None):
+        self.name, self.reply, self.delay, self.error = name, reply, delay, error
+        self.calls = []
+
+    def generate(self, product, category, colors, timeout):
+        self.calls.append(product)
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return dict(self.reply)
+
+
+@pytest.fixture
+def backend(request):
+    """Registers Scripted backends under names unique to the test, with an empty copy cache."""
+    text_gen._cache.clear()
+    made = []
+
+    def make(**kwargs) -> Scripted:
+        b = Scripted(f"{request.node.name}-{len(made)}", **kwargs)
+        text_gen.register_backend(b)
+        made.append(b)
+        return b
+
+    yield make
+    for b in made:
+        text_gen.BACKENDS.pop(b.name, None)
+    text_gen._cache.clear()
+
+
+def _fallbacks(name: str, reason: str) -> float:
+    return COPY_FALLBACKS.snapshot().get((("backend", name), ("reason", reason)), 0)
+
+
+def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_parse_copy_tolerates_text_around_the_json():
+    assert parse_copy('Sure! Here is JSON:\n{"tagline": "Hi"}\nEnjoy.') == {"tagline": "Hi"}
+    assert parse_copy("no json here") == FALLBACK_COPY
+
+
+def test_same_inputs_are_answered_from_cache(backend):
+    b = backend()
+
+    first = generate_creative_text("Shoe", "Footwear", ["#FF0000"], backend=b.name)
+    second = generate_creative_text(" shoe ", "footwear", ["#ff0000"], backend=b.name)
+    other = generate_creative_text("Shoe", "Footwear", ["#00ff00"], backend=b.name)
+
+    assert first == second == other == COPY
+    assert len(b.calls) == 2
+
+
+def test_cached_copy_is_not_shared_mutably(backend):
+    b = backend()
+    generate_creative_text("Shoe", "Footwear", [], backend=b.name)["tagline"] = "changed"
+
+    assert generate_creative_text("Shoe", "Footwear", [], backend=b.name) == COPY
+
+
+def test_cached_copy_expires(backend, monkeypatch):
+    monkeypatch.setattr(text_gen, "COPY_CACHE_TTL", -1)
+    b = backend()
+
+    generate_creative_text("Shoe", "Footwear", [], backend=b.name)
+    generate_creative_text("Shoe", "Footwear", [], backend=b.name)
+
+    assert len(b.calls) == 2
+
+
+def test_slow_backend_gets_fallback_and_fills_cache_later(backend):
+    b = backend(delay=0.3)
+    before = _fallbacks(b.name, "timeout")
+
+    assert generate_creative_text("Shoe", "Footwear", [], backend=b.name, timeout=0.05) == FALLBACK_COPY
+    assert _fallbacks(b.name, "timeout") == before + 1
+
+    _wait_for(lambda: text_gen._inflight == {})
+    assert generate_creative_text("Shoe", "Footwear", [], backend=b.name, timeout=0.05) == COPY
+    assert len(b.calls) == 1
+
+
+def test_backend_errors_fall_back_and_are_not_cached(backend):
+    b = backend(error=RuntimeError("rate limited"))
+    before = _fallbacks(b.name, "error")
+
+    assert generate_creative_text("Shoe", "Footwear", [], backend=b.name) == FALLBACK_COPY
+    assert generate_creative_text("Shoe", "Footwear", [], backend=b.name) == FALLBACK_COPY
+    assert _fallbacks(b.name, "error") == before + 2
+    assert len(b.calls) == 2
+
+
+def test_unparseable_replies_are_not_cached(backend):
+    b = backend(reply=FALLBACK_COPY)
+
+    generate_creative_text("Shoe", "Footwear", [], backend=b.name)
+    generate_creative_text("Shoe", "Footwear", [], backend=b.name)
+
+    assert len(b.calls) == 2
+
+
+def test_concurrent_misses_share_one_backend_call(backend):
+    b = backend(delay=0.2)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(generate_creative_text("Shoe", "Footwear", [], backend=b.name)))
+        for _ in range(6)
+    ]
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [COPY] * 6
+    assert len(b.calls) == 1
+    assert text_gen._inflight == {}
+
+
+def test_timed_out_call_that_has_not_started_is_cancelled(backend, monkeypatch):
+    monkeypatch.setattr(text_gen, "_executor", ThreadPoolExecutor(max_workers=1))
+    busy = backend(delay=0.3)
+    queued = backend()
+    blocker = threading.Thread(target=generate_creative_text, args=("Busy", "Footwear", []), kwargs={"backend": busy.name})
+    blocker.start()
+    _wait_for(lambda: busy.calls)
+
+    assert generate_creative_text("Shoe", "Footwear", [], backend=queued.name, timeout=0.05) == FALLBACK_COPY
+    blocker.join()
+    text_gen._executor.shutdown(wait=True)
+
+    assert queued.calls == []
+    assert text_gen._inflight == {}
+
+
+def test_local_backend_needs_no_network(backend):
+    copy = generate_creative_text("Lamp", "Home", ["#ffffff"], backend="local")
+
+    assert copy["tagline"] == "Meet the New Lamp"
+    assert copy["seo_keywords"] == ["lamp", "home", "deal"]
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.layouts import template_regions
+from utils.templates_engine import SIZES
+from utils.validator import DIRECT_REGIONS, direct_region_checks, integral_image, region_checks, score_image
+
+
+def _per_region_score(img: Image.Image, regions) -> float:
+    # The original validator: slice and reduce every region in NumPy.
+    arr = np.array(img.convert("RGB"))
+    score = 0
+    for region in regions:
+        x, y, w, h = region["bbox"]
+        box = arr[y:y + h, x:x + w]
+        if np.linalg.norm(np.mean(box, axis=(0, 1)) - np.array(region["color"])) < 80:
+            score += 1
+        if box.std() > 25:
+            score += 1
+        if 60 < np.mean(box) < 230:
+            score += 1
+    return round(score / (len(regions) * 3) * 100, 2)
+
+
+def _random_regions(rng, size, n):
+    w, h = size
+    regions = []
+    for _ in range(n):
+        x, y = int(rng.integers(0, w - 1)), int(rng.integers(0, h - 1))
+        regions.append({
+            "bbox": (x, y, int(rng.integers(1, w - x + 1)), int(rng.integers(1, h - y + 1))),
+            "color": tuple(int(c) for c in rng.integers(0, 256, 3)),
+        })
+    return regions
+
+
+def _test_image(rng) -> Image.Image:
+    # Smooth areas, hard edges and noise, so every check both passes and fails somewhere.
+    arr = np.zeros((240, 320, 3), dtype=np.uint8)
+    arr[:, :160] = rng.integers(0, 256, 3)
+    arr[:, 160:] = rng.integers(0, 256, (240, 160, 3))
+    arr[100:180, 40:280] = (arr[100:180, 40:280] // 2) + 60
+    return Image.fromarray(arr, "RGB")
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_summed_area_scores_match_per_region_scores(seed):
+    rng = np.random.default_rng(seed)
+    img = _test_image(rng)
+    regions = _random_regions(rng, img.size, 200)
+
+    assert score_image(img, regions) == _per_region_score(img, regions)
+    assert score_image(integral_image(img), regions) == score_image(img, regions)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_few_regions_are_scored_from_their_own_pixels(seed):
+    rng = np.random.default_rng(seed)
+    img = _test_image(rng)
+    regions = _random_regions(rng, img.size, int(rng.integers(1, DIRECT_REGIONS + 1)))
+
+    assert score_image(img, regions) == _per_region_score(img, regions)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+def test_direct_checks_match_table_checks_on_clipped_and_empty_boxes(mode):
+    rng = np.random.default_rng(7)
+    img = _test_image(rng).convert(mode)
+    bboxes = [(-20, -20, 60, 60), (300, 200, 80, 80), (10, 10, 0, 40), (400, 10, 20, 20), (0, 0, 320, 240)]
+    colors = [tuple(int(c) for c in rng.integers(0, 256, 3)) for _ in bboxes]
+
+    direct = direct_region_checks(img, bboxes, colors)
+
+    assert (direct == region_checks(integral_image(img), bboxes, colors)).all()
+    assert not direct[2].any() and not direct[3].any()
+
+
+def test_channel_sums_stay_int32_up_to_full_hd():
+    sums, squares = integral_image(Image.new("RGB", SIZES["landscape"], (255, 255, 255)))
+
+    assert sums.dtype == np.int32
+    assert squares.dtype == np.int64
+    assert int(sums[0, -1, -1]) == 255 * 1920 * 1080
+
+
+@pytest.mark.parametrize("template", ["clean_minimal", "split_layout", "hero_badge", "gradient_glow", "neon_badge", "diagonal_split"])
+def test_template_regions_lie_on_the_canvas(template, product):
+    for size in SIZES.values():
+        regions = template_regions(template, product, size, (230, 120, 40), "Fresh Summer Deals", "50% OFF")
+
+        assert regions
+        for r in regions:
+            x, y, w, h = r["bbox"]
+            assert w > 0 and h > 0 and x >= 0 and y >= 0 and x + w <= size[0] and y + h <= size[1]
+            assert all(0 <= c <= 255 for c in r["color"])
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from utils import layouts
+from utils.templates_engine import MAX_VARIANTS, SIZES, parse_variants
+
+
+@pytest.mark.parametrize("template", ["clean_minimal", "split_layout", "hero_badge", "gradient_glow", "neon_badge", "diagonal_split"])
+def test_variants_match_single_renders(template, product, tmp_path):
+    variants = [("Fresh Summer Deals", "50% OFF"), ("New In", "Buy 2 get 1")]
+    paths = [str(tmp_path / f"v{i}.png") for i in range(len(variants))]
+    images = layouts.render_variants(template, product, SIZES["square"], (0, 255, 180), variants, paths)
+
+    render = getattr(layouts, f"template_{template}")
+    for (tagline, offer), img in zip(variants, images):
+        single = render(product, str(tmp_path / "single.png"), tagline, offer, (0, 255, 180), SIZES["square"])
+        assert img.tobytes() == single.tobytes()
+
+
+def test_parse_variants_accepts_objects_and_pairs():
+    value = json.dumps([{"tagline": "New In", "offer": "2 for 1"}, ["Fresh", "50% OFF"]])
+
+    assert parse_variants(value) == [("New In", "2 for 1"), ("Fresh", "50% OFF")]
+
+
+@pytest.mark.parametrize("value", [
+    "not json",
+    "{}",
+    "[]",
+    json.dumps([{"tagline": "No offer"}]),
+    json.dumps([["a", "b", "c"]]),
+    json.dumps([["a", 1]]),
+    json.dumps([["a", "b"]] * (MAX_VARIANTS + 1)),
+])
+def test_parse_variants_rejects_bad_lists(value):
+    with pytest.raises(ValueError):
+        parse_variants(value)
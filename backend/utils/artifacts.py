@@ -0,0 +1,206 @@
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from .metrics import ARTIFACT_BYTES, ARTIFACT_ENTRIES, ARTIFACT_EVICTIONS
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only the single-process dev server runs.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Disk budgets; the janitor evicts least recently used entries beyond them.
+UPLOADS_CACHE_BYTES = int(os.environ.get("UPLOADS_CACHE_MB", "512")) * 1024 * 1024
+RESULT_CACHE_BYTES = int(os.environ.get("RESULT_CACHE_MB", "1024")) * 1024 * 1024
+CREATIVES_CACHE_BYTES = int(os.environ.get("CREATIVES_CACHE_MB", "2048")) * 1024 * 1024
+# Seconds an entry may go unused before it is evicted whatever the budget; 0 disables.
+ARTIFACT_TTL = int(os.environ.get("ARTIFACT_TTL", "0"))
+JANITOR_INTERVAL = float(os.environ.get("JANITOR_INTERVAL", "60"))
+# Entries used more recently than this are never evicted: they may still be
+# being written, or be about to be served.
+MIN_AGE = 60
+
+# key -> (bytes, last used, top-level paths)
+Entries = Dict[str, Tuple[int, float, List[str]]]
+
+
+def _stem(name: str) -> str:
+    # no_bg_<digest>.png, its .json and their .tmp files are one entry.
+    return name.split(".", 1)[0]
+
+
+@contextmanager
+def _sweep_lock(folder: str) -> Iterator[bool]:
+    """Whether this process may sweep folder: False while another process is sweeping it."""
+    if fcntl is None:
+        yield True
+        return
+
+    with open(os.path.join(folder, ".sweep.lock"), "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _tree_usage(path: str) -> Tuple[int, float]:
+    """Bytes under path and the newest modification time of it or anything in it."""
+    st = os.stat(path)
+    if not os.path.isdir(path):
+        return st.st_size, st.st_mtime
+
+    size, mtime = 0, st.st_mtime
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                f = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            size += f.st_size
+            mtime = max(mtime, f.st_mtime)
+    return size, mtime
+
+
+class ArtifactStore:
+    """
+    A folder of generated files, evicted least recently used first to stay
+    within a byte budget, and optionally after a TTL.
+
+    An entry is everything whose top-level name maps to the same key: a
+    render spec's folder of creatives, or a no-bg PNG and its metadata. It
+    was last used at its newest modification time, which touch() refreshes.
+    Entries that something else still depends on can be kept with keep().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        folder: str,
+        max_bytes: int,
+        ttl: int = ARTIFACT_TTL,
+        key: Callable[[str], str] = _stem,
+    ):
+        self.name, self.folder, self.max_bytes, self.ttl, self.key = name, folder, max_bytes, ttl, key
+        self._lock = threading.Lock()
+        # Callables returning keys that must not be evicted, read at sweep time.
+        self._keepers: List[Callable[[], Set[str]]] = []
+        os.makedirs(folder, exist_ok=True)
+
+    def keep(self, fn: Callable[[], Set[str]]) -> None:
+        """Never evict the entries whose keys fn returns, whatever their age or the budget."""
+        self._keepers.append(fn)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def write_atomic(self, name: str, data: bytes) -> str:
+        """Write data to name so readers see either nothing or all of it; returns the path."""
+        path = self.path(name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def touch(self, name: str) -> None:
+        """Mark the entry holding top-level name as just used."""
+        if name in ("", ".", "..") or os.path.basename(name) != name:
+            return
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            pass
+
+    def entries(self) -> Entries:
+        entries: Entries = {}
+        for name in os.listdir(self.folder):
+            if name.startswith("."):
+                continue
+            path = self.path(name)
+            try:
+                size, mtime = _tree_usage(path)
+            except OSError:
+                continue
+            key = self.key(name)
+            total, last_used, paths = entries.get(key, (0, 0.0, []))
+            entries[key] = (total + size, max(last_used, mtime), paths + [path])
+        return entries
+
+    def sweep(self, now: Optional[float] = None) -> Optional[dict]:
+        """
+        Evict expired entries, then the least recently used until within budget; returns occupancy.
+
+        Every worker process sweeps the same folders, so a sweep is skipped,
+        returning None, while another process is sweeping. Kept entries
+        count towards the budget but are never evicted.
+        """
+        with self._lock, _sweep_lock(self.folder) as acquired:
+            if not acquired:
+                return None
+            now = time.time() if now is None else now
+            entries = self.entries()
+            total = sum(size for size, _, _ in entries.values())
+            count = len(entries)
+            kept = set().union(*(fn() for fn in self._keepers))
+
+            for key, (size, last_used, paths) in sorted(entries.items(), key=lambda e: e[1][1]):
+                idle = now - last_used
+                expired = self.ttl > 0 and idle > self.ttl
+                if idle < MIN_AGE or (not expired and total <= self.max_bytes):
+                    break
+                if key in kept:
+                    continue
+                for path in paths:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                total -= size
+                count -= 1
+                ARTIFACT_EVICTIONS.inc(store=self.name, reason="ttl" if expired else "budget")
+
+            ARTIFACT_BYTES.set(total, store=self.name)
+            ARTIFACT_ENTRIES.set(count, store=self.name)
+            return {"bytes": total, "entries": count, "max_bytes": self.max_bytes}
+
+
+UPLOADS = ArtifactStore("uploads", os.path.join(ROOT, "uploads"), UPLOADS_CACHE_BYTES)
+PROCESSED = ArtifactStore("processed", os.path.join(ROOT, "processed"), RESULT_CACHE_BYTES)
+# Creatives live in one folder per render spec or variant set, evicted whole.
+CREATIVES = ArtifactStore("creatives", os.path.join(ROOT, "creatives"), CREATIVES_CACHE_BYTES, key=lambda name: name)
+
+STORES = (UPLOADS, PROCESSED, CREATIVES)
+
+
+def _janitor(stores: Tuple[ArtifactStore, ...], interval: float) -> None:
+    while True:
+        for store in stores:
+            try:
+                store.sweep()
+            except Exception:
+                logger.exception("sweeping %s failed", store.name)
+        time.sleep(interval)
+
+
+def start_janitor(stores: Iterable[ArtifactStore] = STORES, interval: float = JANITOR_INTERVAL) -> threading.Thread:
+    """Sweep the stores every interval seconds in a background thread."""
+    thread = threading.Thread(target=_janitor, args=(tuple(stores), interval), name="artifact-janitor", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Tuple, Union
+import os
+import threading
+
+from PIL import Image
+
+from .metrics import cache_result
+
+# Upper bound on the resized variants kept per product asset.
+PRODUCT_CACHE_BYTES = int(os.environ.get("PRODUCT_CACHE_MB", "256")) * 1024 * 1024
+
+
+def fit_box(size: Tuple[int, int], max_width: int, max_height: int) -> Tuple[int, int]:
+    """Largest (w, h) with the aspect ratio of size that fits inside the box."""
+    ow, oh = size
+    ratio = min(max_width / ow, max_height / oh)
+    return int(ow * ratio), int(oh * ratio)
+
+
+class ProductAsset:
+    """
+    A processed (no-bg) product image decoded once per request.
+
+    Every template and size shares the same RGBA buffer, and LANCZOS resizes
+    are memoized by target box in a byte-bounded LRU. Variants returned by
+    fit() are shared between renders and must not be modified in place.
+    """
+
+    def __init__(self, image: Image.Image, max_bytes: int = PRODUCT_CACHE_BYTES):
+        self.image = image if image.mode == "RGBA" else image.convert("RGBA")
+        self.image.load()
+        self.max_bytes = max_bytes
+
+        self._variants: "OrderedDict[Tuple[int, int], Image.Image]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str, max_bytes: int = PRODUCT_CACHE_BYTES) -> "ProductAsset":
+        with Image.open(path) as img:
+            return cls(img.convert("RGBA"), max_bytes)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.image.size
+
+    def fit(self, max_width: int, max_height: int) -> Image.Image:
+        """Product resized to fit the box, reusing an earlier resize when possible."""
+        target = fit_box(self.image.size, max_width, max_height)
+
+        with self._lock:
+            cached = self._variants.get(target)
+            cache_result("product_variant", cached is not None)
+            if cached is not None:
+                self._variants.move_to_end(target)
+                return cached
+
+        resized = self.image.resize(target, resample=Image.Resampling.LANCZOS)
+        nbytes = target[0] * target[1] * 4
+
+        with self._lock:
+            if target not in self._variants and nbytes <= self.max_bytes:
+                self._variants[target] = resized
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    (w, h), _ = self._variants.popitem(last=False)
+                    self._bytes -= w * h * 4
+
+        return resized
+
+
+ProductSource = Union[str, Image.Image, ProductAsset]
+
+
+def as_product_asset(product: ProductSource) -> ProductAsset:
+    """Wrap a path or decoded image as a ProductAsset."""
+    if isinstance(product, ProductAsset):
+        return product
+    if isinstance(product, Image.Image):
+        return ProductAsset(product)
+    return ProductAsset.open(product)
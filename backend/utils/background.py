@@ -1,15 +1,165 @@
-from rembg import remove
+from contextlib import contextmanager
 from PIL import Image
 import io
 import os
+import queue
+import threading
+import time
+from typing import Optional, Union
 
+from .metrics import STARTUP_SECONDS, timed_fn
 
-def remove_background(upload_path: str, output_path: str) -> None:
-    with Image.open(upload_path).convert("RGBA") as img:
-        result = remove(img)
+# rembg pulls in onnxruntime, scipy, scikit-image and numba, so it is only
+# imported by warm-up or the first removal, never at application import.
 
-        if isinstance(result, bytes):
-            result = Image.open(io.BytesIO(result)).convert("RGBA")
+REMBG_MODEL = os.environ.get("REMBG_MODEL", "u2net")
+# Sessions in the pool, i.e. how many removals can run at the same time.
+REMBG_SESSIONS = max(1, int(os.environ.get("REMBG_SESSIONS", "1")))
+# ONNX Runtime intra-op threads per session; 0 leaves the runtime default.
+REMBG_THREADS = int(os.environ.get("REMBG_THREADS", "0"))
 
+_sessions: "queue.Queue" = queue.Queue()
+_ready = threading.Event()
+_init_lock = threading.Lock()
+_warmup_error: Optional[str] = None
+
+
+def _create_session():
+    import onnxruntime as ort
+    from rembg.sessions import sessions_class
+
+    sess_opts = ort.SessionOptions()
+    if REMBG_THREADS > 0:
+        sess_opts.intra_op_num_threads = REMBG_THREADS
+        sess_opts.inter_op_num_threads = 1
+
+    for session_class in sessions_class:
+        if session_class.name() == REMBG_MODEL:
+            return session_class(REMBG_MODEL, sess_opts)
+
+    raise ValueError(f"Unknown rembg model: {REMBG_MODEL}")
+
+
+def preload() -> None:
+    """
+    Import rembg and its dependencies and fetch the model file, without creating a session.
+
+    Meant for the parent of forked workers: the imported code is then shared
+    copy-on-write, while each worker still runs warm_up() itself, since ONNX
+    Runtime sessions and their thread pools do not survive a fork.
+    """
+    start = time.perf_counter()
+    from rembg.sessions import sessions_class
+
+    for session_class in sessions_class:
+        if session_class.name() == REMBG_MODEL:
+            session_class.download_models()
+            break
+    else:
+        raise ValueError(f"Unknown rembg model: {REMBG_MODEL}")
+
+    STARTUP_SECONDS.set(time.perf_counter() - start, phase="preload_rembg")
+
+
+def warm_up() -> None:
+    """Create the session pool and run one inference per session. Safe to call repeatedly."""
+    with _init_lock:
+        if _ready.is_set():
+            return
+
+        start = time.perf_counter()
+        from rembg import remove
+
+        STARTUP_SECONDS.set(time.perf_counter() - start, phase="import_rembg")
+
+        probe = Image.new("RGBA", (64, 64), (255, 255, 255, 255))
+        sessions = []
+        for _ in range(REMBG_SESSIONS):
+            session = _create_session()
+            remove(probe, session=session)
+            sessions.append(session)
+
+        for session in sessions:
+            _sessions.put(session)
+        STARTUP_SECONDS.set(time.perf_counter() - start, phase="warmup")
+        _ready.set()
+
+
+def _background_warm_up() -> None:
+    global _warmup_error
+    try:
+        warm_up()
+    except Exception as e:
+        _warmup_error = f"{type(e).__name__}: {e}"
+        raise
+
+
+def start_warmup() -> threading.Thread:
+    """Warm the session pool in a background thread."""
+    thread = threading.Thread(target=_background_warm_up, name="rembg-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    """True once the session pool is loaded and warmed."""
+    return _ready.is_set()
+
+
+def warmup_error() -> Optional[str]:
+    """Why background warm-up failed, if it did."""
+    return _warmup_error
+
+
+@contextmanager
+def _session():
+    # Blocks until warm-up (started here or in the background) has finished.
+    if not _ready.is_set():
+        warm_up()
+    session = _sessions.get()
+    try:
+        yield session
+    finally:
+        _sessions.put(session)
+
+
+@timed_fn("remove_background")
+def remove_background(
+    source: Union[str, Image.Image],
+    output_path: Optional[str] = None,
+    full_size: Optional[Image.Image] = None,
+) -> Image.Image:
+    """
+    Cut-out of an image path or in-memory image, as RGBA.
+
+    With full_size, a larger copy of the same picture, the mask found on
+    source is upsampled and applied to full_size instead, so a small
+    source gives a full-resolution cut-out. Also written to output_path as
+    PNG when one is given.
+    """
+    from rembg import remove
+
+    if isinstance(source, Image.Image):
+        img = source.convert("RGBA") if source.mode != "RGBA" else source
+    else:
+        with Image.open(source) as f:
+            img = f.convert("RGBA")
+
+    with _session() as session:
+        result = remove(img, session=session, only_mask=full_size is not None)
+
+    if isinstance(result, bytes):
+        result = Image.open(io.BytesIO(result))
+
+    if full_size is not None:
+        mask = result.convert("L").resize(full_size.size, resample=Image.Resampling.BICUBIC)
+        full = full_size.convert("RGBA")
+        # Same compositing rembg applies to its own cut-outs.
+        result = Image.composite(full, Image.new("RGBA", full.size, 0), mask)
+    elif result.mode != "RGBA":
+        result = result.convert("RGBA")
+
+    if output_path:
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         result.save(output_path, format="PNG")
+    return result
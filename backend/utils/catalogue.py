@@ -0,0 +1,229 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List, Optional, Tuple
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+
+from werkzeug.utils import secure_filename
+
+from .encoders import OutputFormat
+from .pipeline import process_upload
+from .result_cache import content_hash
+from .templates_engine import generate_all_creatives
+from .text_gen import generate_creative_text
+
+# SKUs processed at once; also bounds how many finished SKUs wait to be zipped.
+CATALOGUE_WORKERS = int(os.environ.get("CATALOGUE_WORKERS", "4"))
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"}
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable buffer that zipfile writes into and the response drains."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def spool_uploads(files: Iterable, archives: Iterable) -> str:
+    """
+    Copy uploaded images and ZIP archives into a scratch folder and return it.
+
+    Request file handles close when the view returns, before the streamed
+    response has read them.
+    """
+    folder = tempfile.mkdtemp(prefix="catalogue-upload-")
+    for i, f in enumerate(list(files) + list(archives)):
+        if f and f.filename:
+            f.save(os.path.join(folder, f"{i:06d}_{secure_filename(f.filename) or 'upload'}"))
+    return folder
+
+
+def iter_uploads(folder: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    (name, bytes) for each spooled image and each image inside spooled ZIPs, read lazily.
+
+    The folder is deleted once the iterator is exhausted or closed.
+    """
+    try:
+        for entry in sorted(os.listdir(folder)):
+            path = os.path.join(folder, entry)
+            name = entry.split("_", 1)[1]
+
+            if zipfile.is_zipfile(path):
+                with zipfile.ZipFile(path) as zf:
+                    for info in zf.infolist():
+                        if info.is_dir() or os.path.splitext(info.filename)[1].lower() not in IMAGE_EXTENSIONS:
+                            continue
+                        yield os.path.basename(info.filename), zf.read(info)
+            else:
+                with open(path, "rb") as f:
+                    yield name, f.read()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _render_sku(
+    name: str, data: bytes, digest: str, output: Optional[OutputFormat], tmp_root: str, cancel: threading.Event
+) -> dict:
+    # Plain process_upload: SKUs wait their turn for rembg like any upload.
+    upload = process_upload(data, name)
+    colors_hex = [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in upload["palette"]]
+    text = generate_creative_text(product="Product", category="General", colors=colors_hex)
+    tagline = text.get("tagline", "Amazing Deal")
+    offer = text.get("offer_text", "Limited Offer")
+
+    out_folder = tempfile.mkdtemp(dir=tmp_root)
+    creatives = generate_all_creatives(
+        upload["processed_filename"],
+        tagline,
+        offer,
+        colors_hex,
+        output=output,
+        product=upload["product"],
+        cancel=cancel,
+        out_folder=out_folder,
+    )
+    return {
+        "name": name,
+        "digest": digest,
+        "colors": colors_hex,
+        "tagline": tagline,
+        "offer": offer,
+        "creatives": creatives,
+        "out_folder": out_folder,
+    }
+
+
+def _remove_when_done(path: str, futures: List[Future]) -> None:
+    """Delete path now, or once the last of futures, which may still write to it, finishes."""
+    if not futures:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def finished(_) -> None:
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            shutil.rmtree(path, ignore_errors=True)
+
+    for future in futures:
+        future.add_done_callback(finished)
+
+
+def stream_catalogue(
+    uploads: Iterable[Tuple[str, bytes]],
+    output: Optional[OutputFormat] = None,
+    workers: int = CATALOGUE_WORKERS,
+) -> Iterator[bytes]:
+    """
+    Render every upload and stream a ZIP of the creatives plus manifest.json.
+
+    Identical images are rendered once. At most 2 * workers SKUs are in
+    flight, and each SKU's files are deleted once zipped, so memory and
+    scratch disk stay bounded however large the catalogue is. If the client
+    goes away (the generator is closed), queued SKUs are dropped and
+    running ones stop before their next render.
+
+    Background removal is not batched: each SKU runs its own rembg call on
+    the shared REMBG_SESSIONS pool, so with the default single session the
+    SKUs' cut-outs run one at a time and only decoding, copy and rendering
+    overlap. Raise REMBG_SESSIONS for catalogue throughput.
+    """
+    sink = _ZipSink()
+    manifest = []
+    seen = {}
+    tmp_root = tempfile.mkdtemp(prefix="catalogue-")
+    uploads = iter(uploads)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="catalogue")
+    cancel = threading.Event()
+    running = {}
+
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+            exhausted = False
+
+            while running or not exhausted:
+                while not exhausted and len(running) < workers * 2:
+                    try:
+                        name, data = next(uploads)
+                    except StopIteration:
+                        exhausted = True
+                        break
+
+                    digest = content_hash(data)
+                    if digest in seen:
+                        manifest.append({"name": name, "digest": digest, "duplicate_of": seen[digest]})
+                        continue
+                    seen[digest] = name
+                    running[pool.submit(_render_sku, name, data, digest, output, tmp_root, cancel)] = (name, digest)
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, digest = running.pop(future)
+                    try:
+                        sku = future.result()
+                    except Exception as e:
+                        manifest.append({"name": name, "digest": digest, "error": str(e)})
+                        continue
+
+                    stem = f"{os.path.splitext(secure_filename(name))[0] or 'image'}-{digest[:8]}"
+                    files = {}
+                    for entry in sku["creatives"]:
+                        for key, rel in entry.items():
+                            if key == "size":
+                                continue
+                            arcname = f"{stem}/{os.path.basename(rel)}"
+                            zf.write(os.path.join(sku["out_folder"], rel), arcname)
+                            files[f"{entry['size']}_{key}"] = arcname
+                            yield sink.drain()
+
+                    shutil.rmtree(sku["out_folder"], ignore_errors=True)
+                    manifest.append({
+                        "name": name,
+                        "digest": digest,
+                        "colors": sku["colors"],
+                        "tagline": sku["tagline"],
+                        "offer": sku["offer"],
+                        "files": files,
+                    })
+
+            zf.writestr("manifest.json", json.dumps({"items": manifest}, indent=2))
+        yield sink.drain()
+    finally:
+        # Also reached on GeneratorExit; never wait here for SKUs nobody will read.
+        cancel.set()
+        for future in running:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+        if hasattr(uploads, "close"):
+            uploads.close()
+        _remove_when_done(tmp_root, [f for f in running if not f.done()])
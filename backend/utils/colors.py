@@ -1,14 +1,82 @@
-from colorthief import ColorThief
 from colorsys import rgb_to_hls, hls_to_rgb
-from typing import List, Tuple
+from typing import List, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .metrics import timed_fn
 
 RGB = Tuple[int, int, int]
 
+# Longest side of the working copy the palette is computed from.
+PALETTE_SAMPLE_SIZE = 256
+
+
+def _sample_pixels(img: Image.Image, quality: int, alpha_threshold: int) -> np.ndarray:
+    """(N, 3) uint8 array of visible pixels from a downsampled copy of img."""
+    scale = PALETTE_SAMPLE_SIZE / max(img.size)
+    if scale < 1:
+        size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        img = img.resize(size, resample=Image.Resampling.NEAREST)
+
+    arr = np.asarray(img.convert("RGBA")).reshape(-1, 4)[:: max(1, quality)]
+
+    # Like ColorThief: ignore transparent and near-white pixels.
+    visible = arr[:, 3] >= alpha_threshold
+    not_white = ~np.all(arr[:, :3] > 250, axis=1)
+    pixels = arr[visible & not_white, :3]
+
+    if not len(pixels):
+        pixels = arr[visible, :3] if visible.any() else arr[:, :3]
+    return pixels
+
+
+def _median_cut(pixels: np.ndarray, n: int) -> List[RGB]:
+    """Split pixels into up to n boxes and return their mean colours, most populous first."""
+    boxes = [pixels]
+
+    while len(boxes) < n:
+        spreads = [np.ptp(box, axis=0) if len(box) > 1 else np.zeros(3) for box in boxes]
+        scores = [len(box) * int(spread.max()) for box, spread in zip(boxes, spreads)]
+        idx = int(np.argmax(scores))
+        if scores[idx] == 0:
+            break
+
+        box = boxes.pop(idx)
+        channel = box[:, int(np.argmax(spreads[idx]))]
+        median = np.median(channel)
+        lower = channel <= median
+        if lower.all():
+            lower = channel < median
+
+        boxes.extend([box[lower], box[~lower]])
+
+    boxes.sort(key=len, reverse=True)
+    return [tuple(int(round(v)) for v in box.mean(axis=0)) for box in boxes if len(box)]
+
+
+@timed_fn("extract_palette")
+def extract_palette(
+    source: Union[str, Image.Image],
+    n: int = 5,
+    quality: int = 10,
+    alpha_threshold: int = 125,
+) -> List[RGB]:
+    """
+    Dominant colours of an image path or in-memory image.
+
+    Runs a vectorized median cut on a downsampled copy, keeping every
+    quality-th pixel and skipping pixels with alpha below alpha_threshold.
+    """
+    if isinstance(source, Image.Image):
+        pixels = _sample_pixels(source, quality, alpha_threshold)
+    else:
+        with Image.open(source) as img:
+            # JPEGs can be decoded straight at a reduced scale.
+            img.draft("RGB", (PALETTE_SAMPLE_SIZE, PALETTE_SAMPLE_SIZE))
+            pixels = _sample_pixels(img, quality, alpha_threshold)
 
-def extract_palette(path: str, n: int = 5) -> List[RGB]:
-    ct = ColorThief(path)
-    palette = ct.get_palette(color_count=n)
-    return [tuple(c) for c in palette]
+    return _median_cut(pixels, n)
 
 
 def to_hex(rgb: RGB) -> str:
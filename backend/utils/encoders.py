@@ -0,0 +1,114 @@
+from dataclasses import asdict, dataclass
+from typing import Mapping, Optional
+import os
+import uuid
+
+from PIL import Image, features
+
+# Extension written for each supported output format.
+EXTENSIONS = {
+    "png": "png",
+    "webp": "webp",
+    "jpeg": "jpg",
+    "avif": "avif",
+}
+
+PNG_COMPRESS_LEVEL = int(os.environ.get("PNG_COMPRESS_LEVEL", "6"))
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    """How rendered canvases are encoded, plus an optional thumbnail derivative."""
+
+    format: str = "png"
+    quality: int = 85
+    optimize: bool = False
+    thumbnail: int = 0  # longest side of the thumbnail in px; 0 disables it
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.format]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+DEFAULT_OUTPUT = OutputFormat(
+    format=os.environ.get("OUTPUT_FORMAT", "png"),
+    quality=int(os.environ.get("OUTPUT_QUALITY", "85")),
+    optimize=os.environ.get("OUTPUT_OPTIMIZE", "0") == "1",
+    thumbnail=int(os.environ.get("THUMBNAIL_SIZE", "0")),
+)
+
+
+def parse_output(fields: Mapping[str, str], default: OutputFormat = DEFAULT_OUTPUT) -> OutputFormat:
+    """OutputFormat from request fields (format, quality, optimize, thumbnail); raises ValueError."""
+    fmt = fields.get("format", default.format).lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"unsupported format: {fmt}")
+    if fmt in ("webp", "avif") and not features.check(fmt):
+        raise ValueError(f"{fmt} encoding is not available on this server")
+
+    try:
+        quality = int(fields.get("quality", default.quality))
+        thumbnail = int(fields.get("thumbnail", default.thumbnail))
+    except ValueError:
+        raise ValueError("quality and thumbnail must be integers")
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+
+    optimize = str(fields.get("optimize", default.optimize)).lower() in ("1", "true", "yes")
+    return OutputFormat(fmt, quality, optimize, max(0, thumbnail))
+
+
+def thumbnail_path(out_path: str) -> str:
+    root, ext = os.path.splitext(out_path)
+    return f"{root}_thumb{ext}"
+
+
+def _encode(img: Image.Image, out_path: str, output: OutputFormat) -> None:
+    # Encode beside the target and rename, so readers never see a partial file.
+    tmp_path = f"{out_path}.{uuid.uuid4().hex}.tmp"
+    _save(img, tmp_path, output)
+    os.replace(tmp_path, out_path)
+
+
+def _save(img: Image.Image, out_path: str, output: OutputFormat) -> None:
+    if output.format == "png":
+        img.save(out_path, format="PNG", optimize=output.optimize, compress_level=PNG_COMPRESS_LEVEL)
+    elif output.format == "webp":
+        img.save(out_path, format="WEBP", quality=output.quality, lossless=output.quality >= 100, method=4)
+    elif output.format == "jpeg":
+        img.save(out_path, format="JPEG", quality=output.quality, optimize=output.optimize)
+    elif output.format == "avif":
+        img.save(out_path, format="AVIF", quality=output.quality)
+
+
+def save_canvas(canvas: Image.Image, out_path: str, output: Optional[OutputFormat] = None) -> Image.Image:
+    """
+    Encode a finished template canvas, and its thumbnail if one is configured.
+
+    Opaque RGBA canvases are written without an alpha channel; JPEG output
+    flattens any transparency onto white. Returns the image as encoded.
+    """
+    output = output or DEFAULT_OUTPUT
+    img = canvas
+
+    if img.mode == "RGBA":
+        if img.getextrema()[3][0] == 255:
+            img = img.convert("RGB")
+        elif output.format == "jpeg":
+            flat = Image.new("RGB", img.size, (255, 255, 255))
+            flat.paste(img, mask=img.getchannel("A"))
+            img = flat
+
+    _encode(img, out_path, output)
+
+    if output.thumbnail:
+        thumb = img.copy()
+        thumb.thumbnail((output.thumbnail, output.thumbnail), resample=Image.Resampling.BILINEAR, reducing_gap=2.0)
+        _encode(thumb, thumbnail_path(out_path), output)
+
+    return img
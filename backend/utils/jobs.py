@@ -0,0 +1,282 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Pipelines running at once, and submissions allowed to wait behind them.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "32"))
+# Seconds a finished job stays queryable.
+JOB_TTL = int(os.environ.get("JOB_TTL", "3600"))
+# Job state and events live here, so every worker process of the server can
+# answer for jobs that another one is running.
+JOB_DB = os.environ.get("JOB_DB", os.path.join(ROOT, "jobs.db"))
+# How often a stream polls for events of a job running in another process.
+POLL_INTERVAL = 0.2
+
+FINISHED = ("done", "error", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class JobStore:
+    """Job rows and their ordered events in SQLite, shared by every process on the host."""
+
+    def __init__(self, path: str = JOB_DB):
+        self.path = path
+        self._local = threading.local()
+        self._db().executescript(_SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread, and never one inherited across a fork.
+        pid, db = getattr(self._local, "conn", (None, None))
+        if pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (os.getpid(), db)
+        return db
+
+    def create(self, job_id: str) -> None:
+        self._db().execute("INSERT INTO jobs (id, pid, status) VALUES (?, ?, 'queued')", (job_id, os.getpid()))
+
+    def delete(self, job_id: str) -> None:
+        db = self._db()
+        db.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+        db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def append(self, job_id: str, event: dict, status: Optional[str] = None, **fields) -> None:
+        """Add an event, and with status also finish the job, in one transaction."""
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT INTO events (job_id, seq, data) "
+                "SELECT ?, COALESCE(MAX(seq), -1) + 1, ? FROM events WHERE job_id = ?",
+                (job_id, json.dumps(event), job_id),
+            )
+            if event["event"] == "stage":
+                db.execute("UPDATE jobs SET stage = ? WHERE id = ?", (event.get("stage"), job_id))
+            if status:
+                db.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                    (status, json.dumps(fields.get("result")), fields.get("error"), time.time(), job_id),
+                )
+
+    def set_status(self, job_id: str, status: str) -> None:
+        self._db().execute("UPDATE jobs SET status = ? WHERE id = ?", (status, job_id))
+
+    def request_cancel(self, job_id: str) -> bool:
+        return self._db().execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,)).rowcount > 0
+
+    def cancel_requested(self, job_id: str) -> bool:
+        row = self._db().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def row(self, job_id: str) -> Optional[dict]:
+        row = self._db().execute(
+            "SELECT pid, status, stage, result, error FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        pid, status, stage, result, error = row
+        if status not in FINISHED and not _pid_alive(pid):
+            # The process running it exited (a worker restart), so it never will finish.
+            self.append(job_id, {"event": "error", "error": "worker exited"}, "error", error="worker exited")
+            return self.row(job_id)
+        return {"status": status, "stage": stage, "result": json.loads(result) if result else None, "error": error}
+
+    def events(self, job_id: str, since: int = 0) -> List[dict]:
+        rows = self._db().execute(
+            "SELECT data FROM events WHERE job_id = ? AND seq >= ? ORDER BY seq", (job_id, since)
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def expire(self, cutoff: float) -> None:
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "DELETE FROM events WHERE job_id IN (SELECT id FROM jobs WHERE finished_at < ?)", (cutoff,)
+            )
+            db.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+
+
+class Job:
+    """A queued pipeline run in this process; its state and events are kept in the JobStore."""
+
+    def __init__(self, store: JobStore, fn: Callable, args: tuple, kwargs: dict):
+        self.id = uuid.uuid4().hex
+        self.store = store
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = threading.Event()
+        self._cond = threading.Condition()
+
+    def emit(self, event: str, **data) -> None:
+        self.store.append(self.id, {"event": event, **data})
+        # A DELETE may have been served by another process.
+        if self.store.cancel_requested(self.id):
+            self.cancelled.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _finish(self, status: str, **data) -> None:
+        # Status and final event change together so streams never miss the last event.
+        self.store.append(self.id, {"event": status, **data}, status, **data)
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, timeout: float) -> None:
+        with self._cond:
+            self._cond.wait(timeout)
+
+
+class JobManager:
+    """
+    Bounded job queue served by a fixed set of worker threads.
+
+    Jobs run in the process that accepted them, but their status and events
+    are read from the shared JobStore, so any process can report, stream or
+    cancel any job.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE, store: Optional[JobStore] = None):
+        self.workers = workers
+        self.store = store or JobStore()
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=queue_size)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Job:
+        """Queue fn(*args, emit=job.emit, cancel=job.cancelled, **kwargs). Raises QueueFull when the queue is at capacity."""
+        self._start()
+        self.store.expire(time.time() - JOB_TTL)
+
+        job = Job(self.store, fn, args, kwargs)
+        self.store.create(job.id)
+        job.emit("queued", job_id=job.id)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            self.store.delete(job.id)
+            raise QueueFull("job queue is full")
+
+        return job
+
+    def snapshot(self, job_id: str) -> Optional[dict]:
+        """Status, stage, creatives so far, result and error of a job, or None if it is unknown."""
+        row = self.store.row(job_id)
+        if row is None:
+            return None
+        return {
+            "job_id": job_id,
+            "status": row["status"],
+            "stage": row["stage"],
+            "creatives": [e for e in self.store.events(job_id) if e["event"] == "creative"],
+            "result": row["result"],
+            "error": row["error"],
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a job to stop; it finishes as "cancelled" before its next stage. False if it is unknown."""
+        if not self.store.request_cancel(job_id):
+            return False
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job:
+            job.cancelled.set()
+        return True
+
+    def wait_events(self, job_id: str, since: int, timeout: float) -> Tuple[List[dict], bool]:
+        """Events from index since, waiting up to timeout for new ones; also whether the job is done."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self.store.events(job_id, since)
+            row = self.store.row(job_id)
+            done = row is None or row["status"] in FINISHED
+            remaining = deadline - time.monotonic()
+            if events or done or remaining <= 0:
+                # Read after the status, so the final event is never missed.
+                return (self.store.events(job_id, since) if done else events), done
+            if job:
+                job.wait(min(remaining, 1.0))
+            else:
+                time.sleep(min(remaining, POLL_INTERVAL))
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job.cancelled.is_set() or self.store.cancel_requested(job.id):
+                    job._finish("cancelled")
+                    continue
+
+                self.store.set_status(job.id, "running")
+                try:
+                    result = job.fn(*job.args, emit=job.emit, cancel=job.cancelled, **job.kwargs)
+                    job._finish("done", result=result)
+                except Exception as e:
+                    if job.cancelled.is_set():
+                        job._finish("cancelled")
+                    else:
+                        job._finish("error", error=str(e))
+            finally:
+                with self._lock:
+                    self._jobs.pop(job.id, None)
+                self._queue.task_done()
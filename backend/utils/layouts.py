@@ -1,12 +1,40 @@
 # backend/utils/layouts.py
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
-from typing import Union
+from functools import lru_cache
+import numpy as np
+from typing import Any, Optional, Sequence, Union
 import os
 
+from .assets import ProductSource, as_product_asset, fit_box
+from .encoders import OutputFormat, save_canvas
+from .metrics import register_lru, timed_fn
+
 # =========================================================
 # GENERIC HELPERS
 # =========================================================
 
+# Fonts are parsed once per (path, size) and shared process-wide.
+FONT_CACHE_SIZE = 256
+TEXT_METRICS_CACHE_SIZE = 4096
+GRADIENT_CACHE_SIZE = 32
+GLOW_CACHE_SIZE = 64
+# Pre-rendered static layers, one per (template, size, colour). Only the
+# templates whose layers take real work to draw have them; a brand colour's
+# 12 take about 56 MB.
+STATIC_LAYER_CACHE_SIZE = int(os.environ.get("STATIC_LAYER_CACHE_SIZE", "24"))
+
+# A template's product-independent layers: the background everything is
+# drawn on (None where it is a solid fill, cheaper to make than to copy),
+# and optionally an (image, position) overlay that goes above the product
+# and the tagline.
+StaticLayers = tuple[Optional[Image.Image], Optional[tuple[Image.Image, tuple[int, int]]]]
+
+# A template composed up to its copy: the canvas, and whatever the text pass
+# needs from the composition (the product's width, an overlay, or None).
+TemplateBase = tuple[Image.Image, Any]
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
 def load_font(font_path: str, size: int) -> Union[ImageFont.FreeTypeFont, ImageFont.ImageFont]:
     """Safely load a TTF font with fallback."""
     try:
@@ -15,6 +43,19 @@ def load_font(font_path: str, size: int) -> Union[ImageFont.FreeTypeFont, ImageF
         return ImageFont.load_default()
 
 
+def preload_fonts(font_path: str = "arial.ttf", start_size: int = 80, min_size: int = 12) -> None:
+    """Parse every size auto_font_size can pick with these arguments."""
+    for size in range(start_size, min_size - 1, -2):
+        load_font(font_path, size)
+
+
+@lru_cache(maxsize=TEXT_METRICS_CACHE_SIZE)
+def text_size(text: str, font_path: str, size: int) -> tuple[int, int]:
+    """Width and height of text's bounding box in the given font."""
+    bbox = load_font(font_path, size).getbbox(text)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
 def auto_font_size(
     text: str,
     max_width: int,
@@ -23,13 +64,21 @@ def auto_font_size(
     start_size: int = 80,
     min_size: int = 12,
 ) -> Union[ImageFont.FreeTypeFont, ImageFont.ImageFont]:
-    """Automatically reduce font size until text fits the given box."""
-    for size in range(start_size, min_size - 1, -2):
-        font = load_font(font_path, size)
-        bbox = font.getbbox(text)
-        w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    """Largest font size (stepping down by 2 from start_size) at which text fits the box."""
+    sizes = range(start_size, min_size - 1, -2)
+
+    # Text extent grows with font size, so binary-search the first size that fits.
+    lo, hi = 0, len(sizes)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        w, h = text_size(text, font_path, sizes[mid])
         if w <= max_width and h <= max_height:
-            return font
+            hi = mid
+        else:
+            lo = mid + 1
+
+    if lo < len(sizes):
+        return load_font(font_path, sizes[lo])
     return load_font(font_path, min_size)
 
 
@@ -47,9 +96,12 @@ def auto_margins(size: tuple[int, int], scale: float = 0.06) -> int:
 
 def resize_to_fit(image: Image.Image, max_width: int, max_height: int) -> Image.Image:
     """Resize image while preserving aspect ratio."""
-    ow, oh = image.size
-    ratio = min(max_width / ow, max_height / oh)
-    return image.resize((int(ow * ratio), int(oh * ratio)), resample=Image.Resampling.LANCZOS)
+    return image.resize(fit_box(image.size, max_width, max_height), resample=Image.Resampling.LANCZOS)
+
+
+def fit_product(product: ProductSource, max_width: int, max_height: int) -> Image.Image:
+    """Decoded product resized to fit the box, memoized when given a ProductAsset."""
+    return as_product_asset(product).fit(max_width, max_height)
 
 
 def draw_centered_text(
@@ -67,6 +119,134 @@ def draw_centered_text(
 
 
 
+@lru_cache(maxsize=GRADIENT_CACHE_SIZE)
+def vertical_gradient(
+    top: tuple[int, int, int],
+    size: tuple[int, int],
+    bottom: int = 20,
+) -> Image.Image:
+    """
+    Opaque top-to-bottom gradient from top to (bottom, bottom, bottom).
+
+    Row y is top + (bottom - top) * y // height, built in one NumPy operation.
+    The result is cached and shared: copy it before drawing on it.
+    """
+    w, h = size
+    start = np.array(top, dtype=np.int64)
+    y = np.arange(h, dtype=np.int64)[:, None]
+    rows = start + (bottom - start) * y // h
+
+    arr = np.empty((h, w, 4), dtype=np.uint8)
+    arr[..., :3] = rows[:, None, :]
+    arr[..., 3] = 255
+    return Image.fromarray(arr, "RGBA")
+
+
+def glow_margin(radius: float) -> int:
+    """Transparent padding a blurred shape needs so its tail isn't clipped."""
+    return int(radius * 3) + 2
+
+
+@lru_cache(maxsize=GLOW_CACHE_SIZE)
+def glow_sprite(
+    shape_size: tuple[int, int],
+    color: tuple[int, int, int, int],
+    radius: float = 25,
+) -> Image.Image:
+    """
+    Gaussian-blurred ellipse of shape_size on a padded transparent sprite.
+
+    Cached by (shape size, colour, radius); the sprite is shared, so don't modify it.
+    """
+    margin = glow_margin(radius)
+    w, h = shape_size
+    sprite = Image.new("RGBA", (w + margin * 2, h + margin * 2))
+    ImageDraw.Draw(sprite).ellipse((margin, margin, margin + w, margin + h), fill=color)
+    return sprite.filter(ImageFilter.GaussianBlur(radius))
+
+
+register_lru("font", load_font)
+register_lru("text_metrics", text_size)
+register_lru("gradient", vertical_gradient)
+register_lru("glow", glow_sprite)
+
+
+def draw_glow(
+    canvas: Image.Image,
+    box: tuple[int, int, int, int],
+    color: tuple[int, int, int, int],
+    radius: float = 25,
+) -> None:
+    """Composite a soft ellipse glow for box onto canvas, touching only the glow's region."""
+    x0, y0, x1, y1 = box
+    sprite = glow_sprite((x1 - x0, y1 - y0), color, radius)
+    margin = glow_margin(radius)
+    dx, dy = x0 - margin, y0 - margin
+
+    # Clip the sprite to the canvas; alpha_composite needs a non-negative dest.
+    sx0, sy0 = max(0, -dx), max(0, -dy)
+    sx1 = min(sprite.width, canvas.width - dx)
+    sy1 = min(sprite.height, canvas.height - dy)
+    if sx0 >= sx1 or sy0 >= sy1:
+        return
+
+    canvas.alpha_composite(sprite, (dx + sx0, dy + sy0), (sx0, sy0, sx1, sy1))
+
+
+@lru_cache(maxsize=STATIC_LAYER_CACHE_SIZE)
+def static_layers(template: str, size: tuple[int, int], color: tuple[int, int, int]) -> StaticLayers:
+    """
+    Background and overlay of a template for a canvas size and colour, drawn once.
+
+    Shared between renders: copy the background before drawing on it.
+    """
+    return _LAYER_BUILDERS[template](size, color)
+
+
+register_lru("static_layers", static_layers)
+
+
+def apply_overlay(canvas: Image.Image, overlay: Optional[tuple[Image.Image, tuple[int, int]]]) -> None:
+    if overlay is not None:
+        image, position = overlay
+        canvas.alpha_composite(image, position)
+
+
+def prewarm_static_layers(color: tuple[int, int, int], sizes) -> None:
+    """Build every template's static layers for color at each size ahead of rendering."""
+    for template in _LAYER_BUILDERS:
+        for size in sizes:
+            static_layers(template, tuple(size), tuple(color))
+
+
+@timed_fn("render_variants")
+def render_variants(
+    template: str,
+    product: ProductSource,
+    size: tuple[int, int],
+    color: tuple[int, int, int],
+    variants: Sequence[tuple[str, str]],
+    out_paths: Sequence[str],
+    output: Optional[OutputFormat] = None,
+) -> list[Image.Image]:
+    """
+    Render one template at one size once per (tagline, offer) in variants.
+
+    The background and product are composed once; each variant copies that
+    base and draws only its own copy, then is saved to the matching entry of
+    out_paths. template is a static_layers name, e.g. "clean_minimal".
+    """
+    compose, stamp = _TEMPLATE_PASSES[template]
+    base, info = compose(product, size, color)
+
+    images = []
+    for (tagline, offer), out_path in zip(variants, out_paths):
+        canvas = base.copy()
+        stamp(canvas, info, tagline, offer, size, color)
+        images.append(save_canvas(canvas, out_path, output))
+    return images
+
+
 def pill(
     draw: ImageDraw.ImageDraw,
     x: float,
@@ -87,22 +267,18 @@ def pill(
 # TEMPLATE 1 — CLEAN MINIMAL
 # =========================================================
 
-def template_clean_minimal(
-    processed_img_path: str,
-    out_path: str,
-    tagline: str,
-    offer: str,
-    bg_color: tuple[int, int, int] = (255, 255, 255),
-    size: tuple[int, int] = (1080, 1080),
-) -> None:
-
-    canvas = Image.new("RGBA", size, bg_color + (255,))
-    draw = ImageDraw.Draw(canvas)
+def _clean_minimal_base(product, size, bg_color) -> TemplateBase:
+    canvas = Image.new("RGBA", size, tuple(bg_color) + (255,))
     pad = auto_margins(size)
 
-    product = Image.open(processed_img_path).convert("RGBA")
-    product = resize_to_fit(product, int(size[0] * 0.70), int(size[1] * 0.55))
+    product = fit_product(product, int(size[0] * 0.70), int(size[1] * 0.55))
     canvas.paste(product, ((size[0] - product.width) // 2, pad + 80), product)
+    return canvas, None
+
+
+def _clean_minimal_text(canvas, info, tagline, offer, size, bg_color) -> None:
+    draw = ImageDraw.Draw(canvas)
+    pad = auto_margins(size)
 
     text_color = pick_best_text_color(bg_color)
     tagline_font = auto_font_size(tagline, size[0] - pad * 2, 160)
@@ -121,32 +297,49 @@ def template_clean_minimal(
     pill(draw, ox, oy, pw, ph, (255, 60, 60), radius=40)
     draw.text((ox + pill_pad, oy + pill_pad), offer, fill=(255, 255, 255), font=offer_font)
 
-    canvas.save(out_path)
 
-
-# =========================================================
-# TEMPLATE 2 — SPLIT MODERN
-# =========================================================
-
-def template_split_layout(
-    processed_img_path: str,
+@timed_fn("template_clean_minimal")
+def template_clean_minimal(
+    product: ProductSource,
     out_path: str,
     tagline: str,
     offer: str,
-    brand_color: tuple[int, int, int] = (30, 144, 255),
+    bg_color: tuple[int, int, int] = (255, 255, 255),
     size: tuple[int, int] = (1080, 1080),
-) -> None:
+    output: Optional[OutputFormat] = None,
+) -> Image.Image:
+
+    canvas, info = _clean_minimal_base(product, size, bg_color)
+    _clean_minimal_text(canvas, info, tagline, offer, size, bg_color)
+    return save_canvas(canvas, out_path, output)
+
+
+# =========================================================
+# TEMPLATE 2 — SPLIT MODERN
+# =========================================================
 
+def _split_layout_layers(size, brand_color) -> StaticLayers:
     canvas = Image.new("RGBA", size, (255, 255, 255, 255))
+    right_w = int(size[0] * 0.40)
+    ImageDraw.Draw(canvas).rectangle((size[0] - right_w, 0, size[0], size[1]), fill=brand_color)
+    return canvas, None
+
+
+def _split_layout_base(product, size, brand_color) -> TemplateBase:
+    background, _ = static_layers("split_layout", tuple(size), tuple(brand_color))
+    canvas = background.copy()
+    pad = auto_margins(size)
+
+    product = fit_product(product, int(size[0] * 0.55), int(size[1] * 0.75))
+    canvas.paste(product, (pad, (size[1] - product.height) // 2), product)
+    return canvas, None
+
+
+def _split_layout_text(canvas, info, tagline, offer, size, brand_color) -> None:
     draw = ImageDraw.Draw(canvas)
     pad = auto_margins(size)
 
     right_w = int(size[0] * 0.40)
-    draw.rectangle((size[0] - right_w, 0, size[0], size[1]), fill=brand_color)
-
-    product = Image.open(processed_img_path).convert("RGBA")
-    product = resize_to_fit(product, int(size[0] * 0.55), int(size[1] * 0.75))
-    canvas.paste(product, (pad, (size[1] - product.height) // 2), product)
 
     text_color = pick_best_text_color(brand_color)
     tagline_font = auto_font_size(tagline, right_w - pad * 2, 200)
@@ -158,35 +351,47 @@ def template_split_layout(
     draw.text((tx, ty), tagline, fill=text_color, font=tagline_font)
     draw.text((tx, ty + 160), offer, fill=text_color, font=offer_font)
 
-    canvas.save(out_path)
-
-
-# =========================================================
-# TEMPLATE 3 — HERO BADGE
-# =========================================================
 
-def template_hero_badge(
-    processed_img_path: str,
+@timed_fn("template_split_layout")
+def template_split_layout(
+    product: ProductSource,
     out_path: str,
     tagline: str,
     offer: str,
-    badge_color: tuple[int, int, int] = (255, 69, 0),
+    brand_color: tuple[int, int, int] = (30, 144, 255),
     size: tuple[int, int] = (1080, 1080),
-) -> None:
+    output: Optional[OutputFormat] = None,
+) -> Image.Image:
+
+    canvas, info = _split_layout_base(product, size, brand_color)
+    _split_layout_text(canvas, info, tagline, offer, size, brand_color)
+    return save_canvas(canvas, out_path, output)
+
+
+# =========================================================
+# TEMPLATE 3 — HERO BADGE
+# =========================================================
 
+def _hero_badge_base(product, size, badge_color) -> TemplateBase:
+    # The badge sits beside the product, wherever its width puts it, so it is drawn per render.
     canvas = Image.new("RGBA", size, (255, 255, 255, 255))
-    draw = ImageDraw.Draw(canvas)
     pad = auto_margins(size)
 
-    product = Image.open(processed_img_path).convert("RGBA")
-    product = resize_to_fit(product, int(size[0] * 0.58), int(size[1] * 0.75))
+    product = fit_product(product, int(size[0] * 0.58), int(size[1] * 0.75))
     canvas.paste(product, (pad, (size[1] - product.height) // 2), product)
+    # Text and badge line up with the product's right edge.
+    return canvas, product.width
+
+
+def _hero_badge_text(canvas, product_width, tagline, offer, size, badge_color) -> None:
+    draw = ImageDraw.Draw(canvas)
+    pad = auto_margins(size)
 
     tagline_font = auto_font_size(tagline, int(size[0] * 0.32), 200)
-    draw.text((pad + product.width + pad, pad), tagline, fill=(0, 0, 0), font=tagline_font)
+    draw.text((pad + product_width + pad, pad), tagline, fill=(0, 0, 0), font=tagline_font)
 
     badge = int(min(size) * 0.22)
-    bx = pad + product.width + pad
+    bx = pad + product_width + pad
     by = pad + 260
 
     draw.ellipse((bx, by, bx + badge, by + badge), fill=badge_color)
@@ -199,42 +404,45 @@ def template_hero_badge(
 
     draw.text((bx + (badge - w) // 2, by + (badge - h) // 2), offer, fill=offer_color, font=offer_font)
 
-    canvas.save(out_path)
+
+@timed_fn("template_hero_badge")
+def template_hero_badge(
+    product: ProductSource,
+    out_path: str,
+    tagline: str,
+    offer: str,
+    badge_color: tuple[int, int, int] = (255, 69, 0),
+    size: tuple[int, int] = (1080, 1080),
+    output: Optional[OutputFormat] = None,
+) -> Image.Image:
+
+    canvas, info = _hero_badge_base(product, size, badge_color)
+    _hero_badge_text(canvas, info, tagline, offer, size, badge_color)
+    return save_canvas(canvas, out_path, output)
 
 
 # =========================================================
 # TEMPLATE 4 — GRADIENT GLOW (Premium)
 # =========================================================
 
-def template_gradient_glow(
-    processed_img_path: str,
-    out_path: str,
-    tagline: str,
-    offer: str,
-    brand_color: tuple[int, int, int] = (255, 100, 80),
-    size: tuple[int, int] = (1080, 1080),
-) -> None:
+def _gradient_glow_layers(size, brand_color) -> StaticLayers:
+    # The glow follows the offer text's size, so only the gradient is static.
+    return vertical_gradient(brand_color, size), None
 
-    canvas = Image.new("RGBA", size, (0, 0, 0, 255))
-    pad = auto_margins(size)
 
-    grad = Image.new("RGBA", size)
-    gd = ImageDraw.Draw(grad)
-    for y in range(size[1]):
-        col = (
-            brand_color[0] + (20 - brand_color[0]) * y // size[1],
-            brand_color[1] + (20 - brand_color[1]) * y // size[1],
-            brand_color[2] + (20 - brand_color[2]) * y // size[1],
-            255,
-        )
-        gd.line([(0, y), (size[0], y)], fill=col)
-
-    canvas = Image.alpha_composite(canvas, grad)
-    draw = ImageDraw.Draw(canvas)
+def _gradient_glow_base(product, size, brand_color) -> TemplateBase:
+    background, _ = static_layers("gradient_glow", tuple(size), tuple(brand_color))
+    canvas = background.copy()
+    pad = auto_margins(size)
 
-    product = Image.open(processed_img_path).convert("RGBA")
-    product = resize_to_fit(product, int(size[0] * 0.70), int(size[1] * 0.65))
+    product = fit_product(product, int(size[0] * 0.70), int(size[1] * 0.65))
     canvas.paste(product, ((size[0] - product.width) // 2, pad + 100), product)
+    return canvas, None
+
+
+def _gradient_glow_text(canvas, info, tagline, offer, size, brand_color) -> None:
+    draw = ImageDraw.Draw(canvas)
+    pad = auto_margins(size)
 
     tagline_font = auto_font_size(tagline, size[0] - pad * 2, 170)
     offer_font = auto_font_size(offer, size[0] - pad * 2, 200)
@@ -246,54 +454,70 @@ def template_gradient_glow(
     ox = (size[0] - w) // 2
     oy = size[1] - h - pad * 2
 
-    glow = Image.new("RGBA", size)
-    gd2 = ImageDraw.Draw(glow)
-    gd2.ellipse((ox - 20, oy - 20, ox + w + 20, oy + h + 20), fill=(255, 255, 255, 80))
-    glow = glow.filter(ImageFilter.GaussianBlur(25))
-
-    canvas = Image.alpha_composite(canvas, glow)
-    draw = ImageDraw.Draw(canvas)
+    draw_glow(canvas, (ox - 20, oy - 20, ox + w + 20, oy + h + 20), (255, 255, 255, 80), 25)
     draw.text((ox + w // 8, oy), offer, font=offer_font, fill=(0, 0, 0))
 
-    canvas.save(out_path)
+
+@timed_fn("template_gradient_glow")
+def template_gradient_glow(
+    product: ProductSource,
+    out_path: str,
+    tagline: str,
+    offer: str,
+    brand_color: tuple[int, int, int] = (255, 100, 80),
+    size: tuple[int, int] = (1080, 1080),
+    output: Optional[OutputFormat] = None,
+) -> Image.Image:
+
+    canvas, info = _gradient_glow_base(product, size, brand_color)
+    _gradient_glow_text(canvas, info, tagline, offer, size, brand_color)
+    return save_canvas(canvas, out_path, output)
 
 
 # =========================================================
 # TEMPLATE 5 — NEON BADGE (Premium)
 # =========================================================
 
-def template_neon_badge(
-    processed_img_path: str,
-    out_path: str,
-    tagline: str,
-    offer: str,
-    neon_color: tuple[int, int, int] = (0, 255, 180),
-    size: tuple[int, int] = (1080, 1080),
-) -> None:
+def _neon_badge_box(size) -> tuple[int, int, int]:
+    pad = auto_margins(size)
+    badge = int(min(size) * 0.28)
+    return size[0] - badge - pad, size[1] - badge - pad * 2, badge
+
 
+def _neon_badge_layers(size, neon_color) -> StaticLayers:
+    # The ring and its glow, on a transparent patch just big enough for the glow's tail.
+    bx, by, badge = _neon_badge_box(size)
+    margin = glow_margin(25)
+    x0, y0 = max(0, bx - margin), max(0, by - margin)
+    x1, y1 = min(size[0], bx + badge + margin + 1), min(size[1], by + badge + margin + 1)
+
+    ring = Image.new("RGBA", (x1 - x0, y1 - y0))
+    box = (bx - x0, by - y0, bx - x0 + badge, by - y0 + badge)
+    draw_glow(ring, box, tuple(neon_color) + (60,), 25)
+    ImageDraw.Draw(ring).ellipse(box, outline=neon_color, width=8)
+    return None, (ring, (x0, y0))
+
+
+def _neon_badge_base(product, size, neon_color) -> TemplateBase:
+    _, ring = static_layers("neon_badge", tuple(size), tuple(neon_color))
     canvas = Image.new("RGBA", size, (20, 20, 20, 255))
-    draw = ImageDraw.Draw(canvas)
     pad = auto_margins(size)
 
-    product = Image.open(processed_img_path).convert("RGBA")
-    product = resize_to_fit(product, int(size[0] * 0.70), int(size[1] * 0.70))
+    product = fit_product(product, int(size[0] * 0.70), int(size[1] * 0.70))
     canvas.paste(product, ((size[0] - product.width) // 2, pad + 120), product)
+    return canvas, ring
 
-    tagline_font = auto_font_size(tagline, size[0] - pad * 2, 160)
-    draw_centered_text(draw, tagline, tagline_font, size[0], pad, (255, 255, 255))
 
-    badge = int(min(size) * 0.28)
-    bx = size[0] - badge - pad
-    by = size[1] - badge - pad * 2
+def _neon_badge_text(canvas, ring, tagline, offer, size, neon_color) -> None:
+    draw = ImageDraw.Draw(canvas)
+    pad = auto_margins(size)
 
-    glow = Image.new("RGBA", size)
-    gd = ImageDraw.Draw(glow)
-    gd.ellipse((bx, by, bx + badge, by + badge), fill=neon_color + (60,))
-    glow = glow.filter(ImageFilter.GaussianBlur(25))
+    tagline_font = auto_font_size(tagline, size[0] - pad * 2, 160)
+    draw_centered_text(draw, tagline, tagline_font, size[0], pad, (255, 255, 255))
 
-    canvas = Image.alpha_composite(canvas, glow)
-    draw = ImageDraw.Draw(canvas)
-    draw.ellipse((bx, by, bx + badge, by + badge), outline=neon_color, width=8)
+    # The ring goes over the product and tagline.
+    apply_overlay(canvas, ring)
+    bx, by, badge = _neon_badge_box(size)
 
     offer_font = auto_font_size(offer, int(badge * 0.8), int(badge * 0.8))
     bbox = draw.textbbox((0, 0), offer, font=offer_font)
@@ -301,25 +525,29 @@ def template_neon_badge(
 
     draw.text((bx + (badge - w) // 2, by + (badge - h) // 2), offer, fill=(0, 0, 0), font=offer_font)
 
-    canvas.save(out_path)
 
-
-# =========================================================
-# TEMPLATE 6 — DIAGONAL SPLIT (Premium)
-# =========================================================
-
-def template_diagonal_split(
-    processed_img_path: str,
+@timed_fn("template_neon_badge")
+def template_neon_badge(
+    product: ProductSource,
     out_path: str,
     tagline: str,
     offer: str,
-    brand_color: tuple[int, int, int] = (40, 40, 40),
+    neon_color: tuple[int, int, int] = (0, 255, 180),
     size: tuple[int, int] = (1080, 1080),
-) -> None:
+    output: Optional[OutputFormat] = None,
+) -> Image.Image:
+
+    canvas, info = _neon_badge_base(product, size, neon_color)
+    _neon_badge_text(canvas, info, tagline, offer, size, neon_color)
+    return save_canvas(canvas, out_path, output)
+
 
+# =========================================================
+# TEMPLATE 6 — DIAGONAL SPLIT (Premium)
+# =========================================================
+
+def _diagonal_split_layers(size, brand_color) -> StaticLayers:
     canvas = Image.new("RGBA", size, (255, 255, 255, 255))
-    draw = ImageDraw.Draw(canvas)
-    pad = auto_margins(size)
 
     diag = Image.new("RGBA", size)
     d = ImageDraw.Draw(diag)
@@ -333,11 +561,22 @@ def template_diagonal_split(
         fill=brand_color,
     )
 
-    canvas = Image.alpha_composite(canvas, diag)
+    return Image.alpha_composite(canvas, diag), None
+
+
+def _diagonal_split_base(product, size, brand_color) -> TemplateBase:
+    background, _ = static_layers("diagonal_split", tuple(size), tuple(brand_color))
+    canvas = background.copy()
+    pad = auto_margins(size)
 
-    product = Image.open(processed_img_path).convert("RGBA")
-    product = resize_to_fit(product, int(size[0] * 0.55), int(size[1] * 0.70))
+    product = fit_product(product, int(size[0] * 0.55), int(size[1] * 0.70))
     canvas.paste(product, (pad, size[1] - product.height - pad), product)
+    return canvas, None
+
+
+def _diagonal_split_text(canvas, info, tagline, offer, size, brand_color) -> None:
+    draw = ImageDraw.Draw(canvas)
+    pad = auto_margins(size)
 
     text_color = pick_best_text_color(brand_color)
     tagline_font = auto_font_size(tagline, size[0] - pad * 3, 200)
@@ -346,4 +585,204 @@ def template_diagonal_split(
     draw.text((pad * 2, int(pad * 1.6)), tagline, fill=text_color, font=tagline_font)
     draw.text((pad * 2, int(pad * 1.6 + 180)), offer, fill=text_color, font=offer_font)
 
-    canvas.save(out_path)
+
+@timed_fn("template_diagonal_split")
+def template_diagonal_split(
+    product: ProductSource,
+    out_path: str,
+    tagline: str,
+    offer: str,
+    brand_color: tuple[int, int, int] = (40, 40, 40),
+    size: tuple[int, int] = (1080, 1080),
+    output: Optional[OutputFormat] = None,
+) -> Image.Image:
+
+    canvas, info = _diagonal_split_base(product, size, brand_color)
+    _diagonal_split_text(canvas, info, tagline, offer, size, brand_color)
+    return save_canvas(canvas, out_path, output)
+
+
+# =========================================================
+# VALIDATION REGIONS
+# =========================================================
+# Where each template puts its copy, badges and panels, and the mean colour
+# each of those boxes should have, for the validator. They follow the same
+# geometry as the text passes above.
+
+Region = dict
+
+
+def _blend(a, b, t: float) -> tuple[float, float, float]:
+    return tuple(x + (y - x) * t for x, y in zip(a, b))
+
+
+def _ink(text: str, font) -> float:
+    """Pixels of text's glyphs, counting antialiased edges fractionally."""
+    return np.asarray(font.getmask(text), dtype=np.float64).sum() / 255
+
+
+def _box_region(bbox: tuple[int, int, int, int], fill, text: str, font, text_fill) -> Region:
+    """A box of fill holding text, expected to average the two by the text's share of the box."""
+    coverage = _ink(text, font) / max(1, bbox[2] * bbox[3])
+    return {"bbox": bbox, "color": _blend(fill, text_fill, min(coverage, 1.0))}
+
+
+def _text_region(text: str, font, xy: tuple[int, int], fill, background) -> Region:
+    """The box of text drawn at xy over background."""
+    x0, y0, x1, y1 = font.getbbox(text)
+    return _box_region((xy[0] + x0, xy[1] + y0, x1 - x0, y1 - y0), background, text, font, fill)
+
+
+def _centered_xy(text: str, font, canvas_width: int, y: int) -> tuple[int, int]:
+    x0, _, x1, _ = font.getbbox(text)
+    return (canvas_width - (x1 - x0)) // 2, y
+
+
+def _badge_region(text: str, font, box: tuple[int, int, int], fill, text_fill) -> Region:
+    """The square inside a round badge, holding its centred text."""
+    bx, by, badge = box
+    side = int(badge * 0.7)
+    return _box_region((bx + (badge - side) // 2, by + (badge - side) // 2, side, side), fill, text, font, text_fill)
+
+
+def _clean_minimal_regions(product, size, bg_color, tagline, offer) -> list[Region]:
+    pad = auto_margins(size)
+    tagline_font = auto_font_size(tagline, size[0] - pad * 2, 160)
+    offer_font = auto_font_size(offer, size[0] - pad * 2, 200)
+    text_color = pick_best_text_color(bg_color)
+
+    x0, y0, x1, y1 = offer_font.getbbox(offer)
+    pill_pad = 25
+    pw, ph = (x1 - x0) + pill_pad * 2, (y1 - y0) + pill_pad * 2
+    ox, oy = (size[0] - pw) // 2, size[1] - ph - pad
+
+    return [
+        _text_region(tagline, tagline_font, _centered_xy(tagline, tagline_font, size[0], pad), text_color, bg_color),
+        _box_region((ox, oy, pw, ph), (255, 60, 60), offer, offer_font, (255, 255, 255)),
+    ]
+
+
+def _split_layout_regions(product, size, brand_color, tagline, offer) -> list[Region]:
+    pad = auto_margins(size)
+    right_w = int(size[0] * 0.40)
+    text_color = pick_best_text_color(brand_color)
+    tagline_font = auto_font_size(tagline, right_w - pad * 2, 200)
+    offer_font = auto_font_size(offer, right_w - pad * 2, 200)
+    tx, ty = size[0] - right_w + pad, int(pad * 1.5)
+
+    return [
+        {"bbox": (size[0] - right_w, 0, right_w, size[1]), "color": brand_color},
+        _text_region(tagline, tagline_font, (tx, ty), text_color, brand_color),
+        _text_region(offer, offer_font, (tx, ty + 160), text_color, brand_color),
+    ]
+
+
+def _hero_badge_regions(product, size, badge_color, tagline, offer) -> list[Region]:
+    pad = auto_margins(size)
+    product_width = fit_product(product, int(size[0] * 0.58), int(size[1] * 0.75)).width
+    tagline_font = auto_font_size(tagline, int(size[0] * 0.32), 200)
+    badge = int(min(size) * 0.22)
+    offer_font = auto_font_size(offer, int(badge * 0.8), int(badge * 0.8))
+    x = pad + product_width + pad
+
+    return [
+        _text_region(tagline, tagline_font, (x, pad), (0, 0, 0), (255, 255, 255)),
+        _badge_region(offer, offer_font, (x, pad + 260, badge), badge_color, pick_best_text_color(badge_color)),
+    ]
+
+
+def _gradient_glow_regions(product, size, brand_color, tagline, offer) -> list[Region]:
+    pad = auto_margins(size)
+    tagline_font = auto_font_size(tagline, size[0] - pad * 2, 170)
+    offer_font = auto_font_size(offer, size[0] - pad * 2, 200)
+
+    def background(y: int) -> tuple[float, float, float]:
+        # The gradient's row colour, as vertical_gradient computes it.
+        return tuple(c + (20 - c) * y // size[1] for c in brand_color)
+
+    x0, y0, x1, y1 = offer_font.getbbox(offer)
+    w, h = x1 - x0 + 30, y1 - y0 + 30
+    ox, oy = (size[0] - w) // 2, size[1] - h - pad * 2
+    # The offer sits on a white glow at alpha 80.
+    glow = _blend(background(oy + h // 2), (255, 255, 255), 80 / 255)
+
+    return [
+        _text_region(tagline, tagline_font, _centered_xy(tagline, tagline_font, size[0], pad), (255, 255, 255), background(pad)),
+        _text_region(offer, offer_font, (ox + w // 8, oy), (0, 0, 0), glow),
+    ]
+
+
+def _neon_badge_regions(product, size, neon_color, tagline, offer) -> list[Region]:
+    pad = auto_margins(size)
+    tagline_font = auto_font_size(tagline, size[0] - pad * 2, 160)
+    bx, by, badge = _neon_badge_box(size)
+    offer_font = auto_font_size(offer, int(badge * 0.8), int(badge * 0.8))
+    # Inside the ring, the dark background is tinted by the glow at alpha 60.
+    inside = _blend((20, 20, 20), neon_color, 60 / 255)
+
+    return [
+        _text_region(tagline, tagline_font, _centered_xy(tagline, tagline_font, size[0], pad), (255, 255, 255), (20, 20, 20)),
+        _badge_region(offer, offer_font, (bx, by, badge), inside, (0, 0, 0)),
+    ]
+
+
+def _diagonal_split_regions(product, size, brand_color, tagline, offer) -> list[Region]:
+    pad = auto_margins(size)
+    text_color = pick_best_text_color(brand_color)
+    tagline_font = auto_font_size(tagline, size[0] - pad * 3, 200)
+    offer_font = auto_font_size(offer, size[0] - pad * 3, 160)
+
+    return [
+        # The band across the top that the diagonal never cuts.
+        {"bbox": (0, 0, size[0], int(size[1] * 0.30)), "color": brand_color},
+        _text_region(tagline, tagline_font, (pad * 2, int(pad * 1.6)), text_color, brand_color),
+        _text_region(offer, offer_font, (pad * 2, int(pad * 1.6 + 180)), text_color, brand_color),
+    ]
+
+
+def template_regions(
+    template: str,
+    product: ProductSource,
+    size: tuple[int, int],
+    color: tuple[int, int, int],
+    tagline: str,
+    offer: str,
+) -> list[Region]:
+    """
+    Regions of a creative as the validator scores them: {"bbox": (x, y, w, h), "color": mean RGB}.
+
+    Text boxes expect their background blended with the text colour by ink
+    coverage; badges and panels expect their fill. template is a
+    static_layers name, e.g. "clean_minimal".
+    """
+    return _TEMPLATE_REGIONS[template](product, tuple(size), tuple(color), tagline, offer)
+
+
+# Solid-fill templates (clean_minimal, hero_badge) have nothing worth caching.
+_LAYER_BUILDERS = {
+    "split_layout": _split_layout_layers,
+    "gradient_glow": _gradient_glow_layers,
+    "neon_badge": _neon_badge_layers,
+    "diagonal_split": _diagonal_split_layers,
+}
+
+# Each template in two passes: compose(product, size, color) draws everything
+# but the copy and returns (canvas, base), and stamp(canvas, info, tagline,
+# offer, size, color) adds the copy on top.
+_TEMPLATE_PASSES = {
+    "clean_minimal": (_clean_minimal_base, _clean_minimal_text),
+    "split_layout": (_split_layout_base, _split_layout_text),
+    "hero_badge": (_hero_badge_base, _hero_badge_text),
+    "gradient_glow": (_gradient_glow_base, _gradient_glow_text),
+    "neon_badge": (_neon_badge_base, _neon_badge_text),
+    "diagonal_split": (_diagonal_split_base, _diagonal_split_text),
+}
+
+_TEMPLATE_REGIONS = {
+    "clean_minimal": _clean_minimal_regions,
+    "split_layout": _split_layout_regions,
+    "hero_badge": _hero_badge_regions,
+    "gradient_glow": _gradient_glow_regions,
+    "neon_badge": _neon_badge_regions,
+    "diagonal_split": _diagonal_split_regions,
+}
@@ -0,0 +1,339 @@
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "retailstudio"
+
+# With several server processes, each writes its metrics and readiness here
+# so that any of them can report for all; empty keeps them per process.
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+# Seconds between those writes.
+METRICS_INTERVAL = float(os.environ.get("METRICS_INTERVAL", "5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# (name, seconds) pairs timed on behalf of the current request, for Server-Timing.
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+        # Callables returning {labels: value}, read at scrape time.
+        self._collectors: List[Callable[[], Dict[Labels, float]]] = []
+
+    def collect_from(self, fn: Callable[[], Dict[Labels, float]]) -> None:
+        self._collectors.append(fn)
+
+    def snapshot(self) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self, extra: Labels = ()) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        for fn in self._collectors:
+            values.update(fn())
+        return [f"{self.name}{_format_labels(extra + k)} {v}" for k, v in sorted(values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.buckets = name, help, buckets
+        # labels -> [per-bucket counts (last slot is +Inf), sum, count]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self, extra: Labels = ()) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._values.items()):
+                key = extra + key
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def families(self, extra: Labels = ()) -> List[Tuple[str, str, str, List[str]]]:
+        """(name, help, kind, sample lines) of every metric."""
+        return [(m.name, m.help, m.kind, m.samples(extra)) for m in self._metrics]
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        return _render(self.families())
+
+
+def _render(families) -> str:
+    lines = []
+    for name, help, kind, samples in families:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines += samples
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(f"{PREFIX}_stage_seconds", "Latency of pipeline stages and template renders."))
+STAGE_IN_FLIGHT = REGISTRY.register(Gauge(f"{PREFIX}_stage_in_flight", "Stages currently running."))
+STAGE_ERRORS = REGISTRY.register(Counter(f"{PREFIX}_stage_errors_total", "Stages that raised."))
+CACHE_REQUESTS = REGISTRY.register(Counter(f"{PREFIX}_cache_requests_total", "Cache lookups by cache and result."))
+HTTP_SECONDS = REGISTRY.register(Histogram(f"{PREFIX}_http_request_seconds", "HTTP request latency by endpoint."))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(f"{PREFIX}_http_in_flight", "HTTP requests being served."))
+STARTUP_SECONDS = REGISTRY.register(Gauge(f"{PREFIX}_startup_seconds", "Time spent in each startup phase."))
+ARTIFACT_BYTES = REGISTRY.register(Gauge(f"{PREFIX}_artifact_bytes", "Disk used by each artifact store, as of its last sweep."))
+ARTIFACT_ENTRIES = REGISTRY.register(Gauge(f"{PREFIX}_artifact_entries", "Entries in each artifact store, as of its last sweep."))
+ARTIFACT_EVICTIONS = REGISTRY.register(Counter(f"{PREFIX}_artifact_evictions_total", "Artifact store entries evicted, by store and reason."))
+COPY_FALLBACKS = REGISTRY.register(Counter(f"{PREFIX}_copy_fallbacks_total", "Requests answered with fallback copy, by backend and reason."))
+
+
+def startup_report() -> Dict[str, float]:
+    """Seconds spent in each startup phase measured so far."""
+    return {dict(labels)["phase"]: round(v, 4) for labels, v in STARTUP_SECONDS.snapshot().items()}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _worker_labels() -> Labels:
+    return (("worker", str(os.getpid())),)
+
+
+def write_worker_snapshot(state: dict) -> None:
+    """Write this process's metrics, labelled worker="<pid>", and state to METRICS_DIR."""
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"families": REGISTRY.families(_worker_labels()), "state": state}, f)
+    os.replace(tmp_path, path)
+
+
+def remove_worker_snapshot(pid: int) -> None:
+    try:
+        os.remove(os.path.join(METRICS_DIR, f"{pid}.json"))
+    except OSError:
+        pass
+
+
+def _worker_snapshots() -> Dict[int, dict]:
+    """Snapshots of every live process in METRICS_DIR; those of exited ones are removed."""
+    snapshots = {}
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith(".json"):
+            continue
+        pid = int(name[:-5])
+        if not _pid_alive(pid):
+            remove_worker_snapshot(pid)
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snapshots[pid] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def worker_states(state: dict) -> Dict[int, dict]:
+    """
+    State of each server process by pid: this one's as given, the others' as
+    of their last snapshot. Only this one without METRICS_DIR.
+    """
+    states = {pid: s["state"] for pid, s in _worker_snapshots().items()} if METRICS_DIR else {}
+    states[os.getpid()] = state
+    return states
+
+
+def render_all() -> str:
+    """
+    Metrics of every server process, each sample labelled with its worker's
+    pid, or only this process's, unlabelled, without METRICS_DIR.
+    """
+    if not METRICS_DIR:
+        return REGISTRY.render()
+
+    snapshots = _worker_snapshots()
+    snapshots[os.getpid()] = {"families": REGISTRY.families(_worker_labels())}
+    merged: Dict[str, list] = {}
+    for _, snapshot in sorted(snapshots.items()):
+        for name, help, kind, samples in snapshot["families"]:
+            merged.setdefault(name, [name, help, kind, []])[3].extend(samples)
+    return _render(merged.values())
+
+
+def _export(state: Callable[[], dict], interval: float) -> None:
+    while True:
+        try:
+            write_worker_snapshot(state())
+        except Exception:
+            logger.exception("writing metrics snapshot failed")
+        time.sleep(interval)
+
+
+def start_exporter(state: Callable[[], dict], interval: float = METRICS_INTERVAL) -> Optional[threading.Thread]:
+    """Write a snapshot every interval seconds in a background thread, if METRICS_DIR is set."""
+    if not METRICS_DIR:
+        return None
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    thread = threading.Thread(target=_export, args=(state, interval), name="metrics-exporter", daemon=True)
+    thread.start()
+    return thread
+
+
+def cache_result(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def register_lru(cache: str, fn) -> None:
+    """Export hits/misses of a functools.lru_cache-wrapped fn as cache_requests_total."""
+
+    def collect() -> Dict[Labels, float]:
+        info = fn.cache_info()
+        return {
+            _labels({"cache": cache, "result": "hit"}): info.hits,
+            _labels({"cache": cache, "result": "miss"}): info.misses,
+        }
+
+    CACHE_REQUESTS.collect_from(collect)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record how long the block takes under stage, and in the request's Server-Timing."""
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_IN_FLIGHT.dec(stage=stage)
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+
+def timed_fn(stage: str) -> Callable:
+    """Decorator form of timed()."""
+
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def start_request_timings() -> contextvars.Token:
+    return _request_timings.set([])
+
+
+def finish_request_timings(token: contextvars.Token) -> List[Tuple[str, float]]:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def bind_context(fn: Callable) -> Callable:
+    """
+    fn wrapped to run in a copy of the caller's context.
+
+    Use when handing work to a thread pool, so timings recorded there still
+    reach the request that caused them.
+    """
+    ctx = contextvars.copy_context()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing value with per-stage durations summed by name, in milliseconds."""
+    summed: Dict[str, float] = {}
+    for name, seconds in timings:
+        summed[name] = summed.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in summed.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,411 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import io
+import os
+import threading
+import time
+
+from PIL import Image, ImageOps
+from werkzeug.utils import secure_filename
+
+from .artifacts import UPLOADS
+from .assets import ProductAsset
+from .background import REMBG_MODEL, remove_background
+from .colors import extract_palette
+from .text_gen import generate_creative_text
+from .templates_engine import (
+    LAZY_RENDER,
+    SIZES,
+    creative_regions,
+    generate_all_creatives,
+    generate_variants,
+    normalize_rgb,
+)
+from .encoders import OutputFormat
+from .layout_suggestions import suggest_layout
+from .layouts import prewarm_static_layers
+from .metrics import bind_context, timed, timed_fn
+from .validator import QUALITY_GATE, score_image
+from . import result_cache
+
+PROCESSED_FOLDER = result_cache.CACHE_FOLDER
+
+# Threads shared by the stages of all in-flight requests.
+STAGE_WORKERS = int(os.environ.get("STAGE_WORKERS", "8"))
+# Report a palette estimated from the upload while rembg runs, to callers
+# that stream progress (/jobs). Progress only: the palette used, returned
+# and cached always comes from the cut-out.
+EARLY_PALETTE = os.environ.get("EARLY_PALETTE", "1") == "1"
+# Also write original uploads to uploads/; the pipeline itself only needs them in memory.
+KEEP_UPLOADS = os.environ.get("KEEP_UPLOADS", "0") == "1"
+# Longest side uploads are segmented and rendered at. No canvas in SIZES is
+# larger, so no template ever needs more of the product than this.
+WORKING_MAX_SIDE = int(os.environ.get("WORKING_MAX_SIDE", max(max(size) for size in SIZES.values())))
+# Segment at working resolution but apply the mask to the full-resolution upload.
+HQ_MASK = os.environ.get("HQ_MASK", "0") == "1"
+
+Emit = Callable[..., None]
+
+_stage_pool = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+
+
+class Cancelled(Exception):
+    pass
+
+
+def _no_emit(event: str, **data) -> None:
+    pass
+
+
+class StageGraph:
+    """
+    A request modelled as named stages with dependencies.
+
+    Each stage starts as soon as the stages it depends on have finished and
+    is called with their results as keyword arguments. Independent stages
+    run concurrently; per-stage wall times are kept in timings.
+    """
+
+    def __init__(self, emit: Optional[Emit] = None, cancel: Optional[threading.Event] = None):
+        self.emit = emit or _no_emit
+        self.cancel = cancel or threading.Event()
+        self.timings: Dict[str, float] = {}
+        self._stages: Dict[str, tuple] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Iterable[str] = ()) -> None:
+        self._stages[name] = (fn, tuple(deps))
+
+    def _run_stage(self, name: str, fn: Callable[..., Any], kwargs: dict) -> Any:
+        if self.cancel.is_set():
+            raise Cancelled(name)
+        self.emit("stage", stage=name)
+        start = time.perf_counter()
+        result = fn(**kwargs)
+        self.timings[name] = time.perf_counter() - start
+        self.emit("stage_done", stage=name, seconds=round(self.timings[name], 4))
+        return result
+
+    def run(self) -> Dict[str, Any]:
+        """Run every stage and return their results by name. Raises Cancelled if cancelled."""
+        results: Dict[str, Any] = {}
+        pending = dict(self._stages)
+        running: Dict[Future, str] = {}
+
+        try:
+            while pending or running:
+                if self.cancel.is_set():
+                    raise Cancelled("pipeline cancelled")
+
+                for name, (fn, deps) in list(pending.items()):
+                    if all(d in results for d in deps):
+                        kwargs = {d: results[d] for d in deps}
+                        running[_stage_pool.submit(bind_context(self._run_stage), name, fn, kwargs)] = name
+                        del pending[name]
+
+                if not running:
+                    raise ValueError(f"unsatisfiable stage dependencies: {sorted(pending)}")
+
+                done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        except BaseException:
+            # Stop work that hasn't started; running stages finish on their own.
+            self.cancel.set()
+            for future in running:
+                future.cancel()
+            raise
+
+        if self.cancel.is_set():
+            raise Cancelled("pipeline cancelled")
+        return results
+
+
+def _center_crop(img: Image.Image, keep: float = 0.5) -> Image.Image:
+    w, h = img.size
+    dx, dy = int(w * (1 - keep) / 2), int(h * (1 - keep) / 2)
+    return img.crop((dx, dy, w - dx, h - dy))
+
+
+@timed_fn("decode_upload")
+def decode_upload(data: bytes, digest: str, filename: str, max_side: Optional[int] = None) -> Image.Image:
+    """
+    Decode upload bytes straight from memory, upright according to their EXIF orientation.
+
+    With max_side, JPEGs are decoded at the smallest DCT scale that still
+    covers it, so a 50 MP photo is never fully expanded in memory. With
+    KEEP_UPLOADS the original bytes are also saved.
+    """
+    if KEEP_UPLOADS:
+        ext = os.path.splitext(secure_filename(filename))[1]
+        UPLOADS.write_atomic(f"{digest}{ext}", data)
+
+    img = Image.open(io.BytesIO(data))
+    if max_side:
+        img.draft("RGB", (max_side, max_side))
+    img.load()
+    return ImageOps.exif_transpose(img)
+
+
+@timed_fn("working_copy")
+def working_copy(img: Image.Image, max_side: int = WORKING_MAX_SIDE) -> Image.Image:
+    """img as RGB/RGBA, downscaled so its longest side is at most max_side."""
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA")
+    scale = max_side / max(img.size)
+    if scale >= 1:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, resample=Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def segment(working: Image.Image, original: Optional[Image.Image] = None) -> Image.Image:
+    """Cut-out of the working image, or with original given, of original using an upsampled mask."""
+    if original is None or original.size == working.size:
+        return remove_background(working)
+    return remove_background(working, full_size=original)
+
+
+def upload_digest(data: bytes) -> str:
+    """
+    Cache key of an upload's no-bg PNG and palette.
+
+    Covers the settings that change the cut-out, so a different model or
+    working size gets new files and URLs rather than reusing stale ones.
+    """
+    return result_cache.content_hash(data, REMBG_MODEL, WORKING_MAX_SIDE, HQ_MASK)
+
+
+def _aspect_ratio(img: Image.Image) -> float:
+    w, h = img.size
+    return w / h if h else 1.0
+
+
+def process_upload(data: bytes, filename: str) -> dict:
+    """
+    Background removal, palette and aspect ratio for one upload, run in sequence.
+
+    Cached by content hash like run_pipeline. Returns digest,
+    processed_filename, palette, aspect_ratio and the decoded product.
+    """
+    digest = upload_digest(data)
+    processed_filename = result_cache.processed_filename(digest)
+    cached = result_cache.lookup(digest)
+
+    if cached:
+        palette, aspect_ratio = cached["palette"], cached["aspect_ratio"]
+        product = ProductAsset.open(os.path.join(PROCESSED_FOLDER, processed_filename))
+    else:
+        upload = decode_upload(data, digest, filename, None if HQ_MASK else WORKING_MAX_SIDE)
+        working = working_copy(upload)
+        aspect_ratio = _aspect_ratio(working)
+        cutout = segment(working, upload if HQ_MASK else None)
+        del upload
+        product = ProductAsset(cutout)
+        palette = extract_palette(cutout)
+        result_cache.store_image(digest, cutout)
+        result_cache.store(digest, palette, aspect_ratio)
+
+    return {
+        "digest": digest,
+        "processed_filename": processed_filename,
+        "palette": palette,
+        "aspect_ratio": aspect_ratio,
+        "product": product,
+    }
+
+
+def run_pipeline(
+    data: bytes,
+    filename: str,
+    base_url: str,
+    emit: Optional[Emit] = None,
+    output: Optional[OutputFormat] = None,
+    cancel: Optional[threading.Event] = None,
+    quality_gate: Optional[float] = None,
+) -> dict:
+    """
+    Upload bytes -> background removal -> palette -> layout -> copy -> creatives.
+
+    The steps run as a StageGraph. Copy and layout need the palette, which
+    comes from the cut-out, so they wait for background removal; only the
+    aspect ratio, and the early palette estimate when emit is given, overlap
+    it. Once the cut-out exists, the no-bg PNG save
+    and palette extraction run side by side, then copy generation, layout
+    suggestions and background pre-warming overlap each other and the save.
+    emit(event, **data) reports each stage and each rendered creative;
+    setting cancel stops the run before its next stage.
+    With a quality_gate above 0 (QUALITY_GATE by default) every creative is
+    scored in memory against its template's layout as it renders, and the response gains a "quality"
+    entry listing the scores and the creatives below the gate.
+    Returns the /generate-creatives response body.
+    """
+    # The early palette estimate is progress for streaming callers only.
+    estimate_palette = EARLY_PALETTE and emit is not None
+    emit = emit or _no_emit
+    graph = StageGraph(emit, cancel)
+    quality_gate = QUALITY_GATE if quality_gate is None else quality_gate
+    scores: Dict[str, float] = {}
+
+    emit("stage", stage="ingest")
+    with timed("ingest"):
+        digest = upload_digest(data)
+        processed_filename = result_cache.processed_filename(digest)
+        processed_path = os.path.join(PROCESSED_FOLDER, processed_filename)
+        processed_url = f"{base_url}/processed/{processed_filename}"
+
+        # Repeat uploads of the same photo skip straight to rendering.
+        cached = result_cache.lookup(digest)
+
+    def processed_ready(save_processed) -> None:
+        emit("processed", processed_image_url=processed_url)
+
+    if cached:
+        graph.add("palette", lambda: cached["palette"])
+        graph.add("aspect_ratio", lambda: cached["aspect_ratio"])
+        graph.add("save_processed", lambda: processed_path)
+        graph.add("product", lambda: ProductAsset.open(processed_path))
+        graph.add("store", processed_ready, ("save_processed",))
+    else:
+        # The upload is decoded once and the cut-out stays in memory from here
+        # to the renders; the only file written is the no-bg PNG we serve.
+        # Everything runs on a copy capped at WORKING_MAX_SIDE, so cost and
+        # memory don't grow with the camera's resolution.
+        if HQ_MASK:
+            graph.add("original", lambda: decode_upload(data, digest, filename))
+            graph.add("working", lambda original: working_copy(original), ("original",))
+            graph.add("remove_background", segment, ("working", "original"))
+        else:
+            # Only the working copy outlives this stage.
+            graph.add("working", lambda: working_copy(decode_upload(data, digest, filename, WORKING_MAX_SIDE)))
+            graph.add("remove_background", segment, ("working",))
+        graph.add("aspect_ratio", lambda working: _aspect_ratio(working), ("working",))
+        graph.add("product", lambda remove_background: ProductAsset(remove_background), ("remove_background",))
+        graph.add(
+            "save_processed",
+            lambda remove_background: result_cache.store_image(digest, remove_background),
+            ("remove_background",),
+        )
+
+        graph.add("palette", lambda remove_background: extract_palette(remove_background), ("remove_background",))
+
+        if estimate_palette:
+            def palette_estimate(working) -> None:
+                # The product is usually centred; cropping keeps most of the backdrop out.
+                estimate = extract_palette(_center_crop(working))
+                emit("palette", colors=[f"#{r:02x}{g:02x}{b:02x}" for r, g, b in estimate], estimate=True)
+
+            graph.add("palette_estimate", palette_estimate, ("working",))
+
+        def store(palette, aspect_ratio, save_processed) -> None:
+            result_cache.store(digest, palette, aspect_ratio)
+            processed_ready(save_processed)
+
+        graph.add("store", store, ("palette", "aspect_ratio", "save_processed"))
+
+    def colors(palette):
+        colors_hex = [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in palette]
+        emit("palette", colors=colors_hex)
+        return colors_hex
+
+    def backgrounds(colors) -> None:
+        brand_color = normalize_rgb(colors[0]) if colors else (255, 0, 0)
+        prewarm_static_layers(brand_color, SIZES.values())
+
+    graph.add("colors", colors, ("palette",))
+    graph.add("layout", lambda aspect_ratio, colors: suggest_layout(aspect_ratio, colors), ("aspect_ratio", "colors"))
+    graph.add(
+        "text",
+        lambda colors: generate_creative_text(product="Product", category="General", colors=colors),
+        ("colors",),
+    )
+    graph.add("backgrounds", backgrounds, ("colors",))
+
+    def render(product, text, colors, backgrounds, **after):
+        brand_color = normalize_rgb(colors[0]) if colors else (255, 0, 0)
+        tagline = text.get("tagline", "Amazing Deal")
+        offer = text.get("offer_text", "Limited Offer")
+
+        def score(size_name: str, template_name: str, canvas: Image.Image) -> None:
+            regions = creative_regions(product, size_name, template_name, tagline, offer, brand_color)
+            scores[f"{size_name}_{template_name}"] = score_image(canvas, regions)
+
+        return generate_all_creatives(
+            processed_filename,
+            tagline,
+            offer,
+            colors,
+            on_render=lambda size, template, name: emit(
+                "creative",
+                size=size,
+                template=template,
+                filename=name,
+                url=f"{base_url}/creatives/{name}",
+            ),
+            output=output,
+            product=product,
+            cancel=graph.cancel,
+            on_canvas=score if quality_gate > 0 else None,
+        )
+
+    # Eager renders overlap the PNG write, and run() waits for both. Lazy
+    # renders read the PNG on request, so it must be written first.
+    deps = ("product", "text", "colors", "backgrounds")
+    graph.add("render", render, deps + ("save_processed",) if LAZY_RENDER else deps)
+
+    results = graph.run()
+    emit("timings", stages={k: round(v, 4) for k, v in graph.timings.items()})
+
+    response = {
+        "success": True,
+        "processed_image_url": processed_url,
+        "colors": results["colors"],
+        "layout_suggestions": results["layout"],
+        "creatives": results["render"],
+    }
+
+    # Lazy renders happen later, one request at a time, so there is nothing to score here.
+    if scores:
+        quality = {
+            "gate": quality_gate,
+            "scores": dict(sorted(scores.items())),
+            "failed": sorted(name for name, s in scores.items() if s < quality_gate),
+        }
+        emit("quality", **quality)
+        response["quality"] = quality
+
+    return response
+
+
+def run_variants(
+    data: bytes,
+    filename: str,
+    base_url: str,
+    variants: List[Tuple[str, str]],
+    output: Optional[OutputFormat] = None,
+) -> dict:
+    """
+    Upload bytes -> background removal -> palette -> one creative per template, size and copy variant.
+
+    For A/B tests of copy: every (tagline, offer) in variants is rendered
+    over the same composed templates. Returns the /generate-variants
+    response body, which carries the variant manifest.
+    """
+    upload = process_upload(data, filename)
+    colors_hex = [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in upload["palette"]]
+
+    manifest = generate_variants(
+        upload["processed_filename"],
+        variants,
+        colors_hex,
+        output=output,
+        product=upload["product"],
+    )
+
+    return {
+        "success": True,
+        "processed_image_url": f"{base_url}/processed/{upload['processed_filename']}",
+        "colors": colors_hex,
+        "manifest_url": f"{base_url}/creatives/{manifest['set_id']}/manifest.json",
+        "variants": manifest["variants"],
+        "creatives": manifest["creatives"],
+    }
@@ -0,0 +1,77 @@
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import os
+import uuid
+
+from PIL import Image
+
+from .artifacts import PROCESSED
+from .metrics import cache_result, timed_fn
+
+RGB = Tuple[int, int, int]
+
+# No-bg PNGs are served straight from the cache, so it lives in processed/.
+CACHE_FOLDER = PROCESSED.folder
+
+
+def content_hash(data: bytes, *settings) -> str:
+    """sha256 of data, and of any settings that change what is derived from it."""
+    h = hashlib.sha256(data)
+    if settings:
+        h.update(json.dumps(settings).encode("utf-8"))
+    return h.hexdigest()
+
+
+def processed_filename(digest: str) -> str:
+    return f"no_bg_{digest}.png"
+
+
+def _meta_path(digest: str) -> str:
+    return os.path.join(CACHE_FOLDER, f"no_bg_{digest}.json")
+
+
+def lookup(digest: str) -> Optional[dict]:
+    """
+    Cached {"palette", "aspect_ratio"} for an upload hash, or None.
+
+    A hit also refreshes the entry's modification time, which is what
+    eviction orders by.
+    """
+    png_path = os.path.join(CACHE_FOLDER, processed_filename(digest))
+    meta_path = _meta_path(digest)
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        os.utime(png_path)
+        os.utime(meta_path)
+    except (OSError, ValueError):
+        cache_result("result", False)
+        return None
+
+    cache_result("result", True)
+    return {
+        "palette": [tuple(c) for c in meta["palette"]],
+        "aspect_ratio": meta["aspect_ratio"],
+    }
+
+
+@timed_fn("save_processed")
+def store_image(digest: str, image: Image.Image) -> str:
+    """Write the no-bg PNG for an upload hash, atomically, and return its path."""
+    path = os.path.join(CACHE_FOLDER, processed_filename(digest))
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    image.save(tmp_path, format="PNG")
+    os.replace(tmp_path, path)
+    return path
+
+
+def store(digest: str, palette: List[RGB], aspect_ratio: float) -> None:
+    """Record the palette and aspect ratio for an upload whose no-bg PNG is already written."""
+    meta_path = _meta_path(digest)
+    tmp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+
+    with open(tmp_path, "w") as f:
+        json.dump({"palette": [list(c) for c in palette], "aspect_ratio": aspect_ratio}, f)
+    os.replace(tmp_path, meta_path)
@@ -1,15 +1,24 @@
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import hashlib
+import json
 import os
+import re
+import threading
+import uuid
 
-RGB = Tuple[int, int, int]
-
-ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-PROCESSED_FOLDER = os.path.join(ROOT, "processed")
-CREATIVES_FOLDER = os.path.join(ROOT, "creatives")
+from PIL import Image
 
-os.makedirs(CREATIVES_FOLDER, exist_ok=True)
+RGB = Tuple[int, int, int]
 
+from .artifacts import CREATIVES, PROCESSED
+from .assets import ProductAsset
+from .encoders import DEFAULT_OUTPUT, PNG_COMPRESS_LEVEL, OutputFormat, thumbnail_path
+from .metrics import bind_context, cache_result
 from .layouts import (
+    render_variants,
+    template_regions,
     template_clean_minimal,
     template_split_layout,
     template_hero_badge,
@@ -18,12 +27,113 @@ from .layouts import (
     template_diagonal_split,
 )
 
+PROCESSED_FOLDER = PROCESSED.folder
+# One folder per render spec or variant set, so requests never share output paths.
+CREATIVES_FOLDER = CREATIVES.folder
+
 SIZES = {
     "square": (1080, 1080),
     "portrait": (1080, 1350),
     "landscape": (1920, 1080),
 }
 
+TEMPLATES = (
+    ("clean", template_clean_minimal),
+    ("split", template_split_layout),
+    ("hero", template_hero_badge),
+    ("gradient", template_gradient_glow),
+    ("neon", template_neon_badge),
+    ("diagonal", template_diagonal_split),
+)
+
+# Renders are independent Pillow jobs; resize, blur, compositing and PNG
+# encoding release the GIL, so a thread pool spreads them across cores.
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", os.cpu_count() or 1))
+
+# Lazy mode returns URLs for every creative but renders each one only on first request.
+LAZY_RENDER = os.environ.get("LAZY_RENDER", "0") == "1"
+# Decoded products kept for lazy renders, which arrive one request at a time.
+LAZY_ASSET_CACHE_SIZE = 4
+# Part of every render spec id. Bump it whenever a change alters rendered
+# pixels, so creatives get new URLs instead of stale immutable caches.
+RENDER_VERSION = 1
+# Most (tagline, offer) pairs one generate_variants call may render.
+MAX_VARIANTS = int(os.environ.get("MAX_VARIANTS", "20"))
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+_CREATIVE_RE = re.compile(r"([0-9a-f]{32})/([a-z]+)_([a-z]+)(?:_thumb)?\.([a-z]+)")
+_inflight: Dict[str, threading.Lock] = {}
+_inflight_lock = threading.Lock()
+
+
+def _shared_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+        return _pool
+
+
+def _render(job) -> Image.Image:
+    template, product, out_path, tagline, offer, brand_color, size, output = job
+    return template(product, out_path, tagline, offer, brand_color, size, output)
+
+
+def _render_variants(job) -> List[Image.Image]:
+    layout, product, size, brand_color, variants, out_paths, output = job
+    return render_variants(layout, product, size, brand_color, variants, out_paths, output)
+
+
+def render_jobs(
+    jobs: list,
+    workers: Optional[int] = None,
+    on_done: Optional[Callable[[int, Image.Image], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    render: Callable = _render,
+) -> None:
+    """
+    Run (template, ...) render jobs, in parallel when more than one worker is configured.
+
+    on_done, if given, is called with each job's index and rendered canvas
+    as soon as that job finishes, on the worker that rendered it. Jobs not
+    yet started are skipped once cancel is set. render turns one job into
+    its result; it defaults to a single template render.
+    """
+    workers = RENDER_WORKERS if workers is None else workers
+
+    def run(indexed_job) -> None:
+        index, job = indexed_job
+        if cancel is not None and cancel.is_set():
+            return
+        canvas = render(job)
+        if on_done:
+            on_done(index, canvas)
+
+    indexed = list(enumerate(jobs))
+    # Template timings belong to the request that queued them.
+    run = bind_context(run)
+
+    if workers <= 1 or len(jobs) <= 1:
+        for item in indexed:
+            run(item)
+        return
+
+    if workers == RENDER_WORKERS:
+        list(_shared_pool().map(run, indexed))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render") as pool:
+        list(pool.map(run, indexed))
+
+
+def _on_disk(out_path: str, output: OutputFormat) -> bool:
+    """Whether an earlier render, in this or another worker process, already wrote out_path."""
+    found = os.path.exists(out_path) and (not output.thumbnail or os.path.exists(thumbnail_path(out_path)))
+    cache_result("creative", found)
+    return found
+
 
 def normalize_rgb(color) -> RGB:
     if isinstance(color, str):
@@ -36,40 +146,318 @@ def normalize_rgb(color) -> RGB:
     return tuple(color[:3])
 
 
+def parse_variants(value: str) -> List[Tuple[str, str]]:
+    """
+    (tagline, offer) pairs from a JSON list of {"tagline", "offer"} objects
+    or [tagline, offer] pairs; raises ValueError.
+    """
+    try:
+        items = json.loads(value)
+    except ValueError:
+        raise ValueError("variants must be a JSON list")
+    if not isinstance(items, list) or not items:
+        raise ValueError("variants must be a non-empty JSON list")
+    if len(items) > MAX_VARIANTS:
+        raise ValueError(f"at most {MAX_VARIANTS} variants per request")
+
+    variants = []
+    for item in items:
+        if isinstance(item, dict):
+            item = (item.get("tagline"), item.get("offer"))
+        if not isinstance(item, (list, tuple)) or len(item) != 2 or not all(isinstance(t, str) for t in item):
+            raise ValueError("each variant needs a tagline and an offer")
+        variants.append((item[0], item[1]))
+    return variants
+
+
+def _write_json_atomic(path: str, data: dict) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def render_spec_id(
+    processed_filename: str,
+    tagline: str,
+    offer: str,
+    brand_color: RGB,
+    output: OutputFormat = DEFAULT_OUTPUT,
+) -> str:
+    """Deterministic id for one set of render inputs; names the folder its creatives live in."""
+    key = json.dumps([
+        RENDER_VERSION, PNG_COMPRESS_LEVEL, processed_filename, tagline, offer, list(brand_color), output.to_dict()
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def variant_set_id(
+    processed_filename: str,
+    variants: List[Tuple[str, str]],
+    brand_color: RGB,
+    output: OutputFormat = DEFAULT_OUTPUT,
+) -> str:
+    """Deterministic id for a set of copy variants; names the folder its creatives live in."""
+    key = json.dumps([
+        RENDER_VERSION, PNG_COMPRESS_LEVEL, processed_filename, [list(v) for v in variants], list(brand_color), output.to_dict()
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+@lru_cache(maxsize=LAZY_ASSET_CACHE_SIZE)
+def _lazy_product(processed_filename: str) -> ProductAsset:
+    return ProductAsset.open(os.path.join(PROCESSED_FOLDER, processed_filename))
+
+
+def _lazy_sources() -> Set[str]:
+    """processed/ keys of the no-bg PNGs that lazy render specs still render from."""
+    sources = set()
+    for spec_id in os.listdir(CREATIVES_FOLDER):
+        try:
+            with open(os.path.join(CREATIVES_FOLDER, spec_id, "spec.json")) as f:
+                sources.add(PROCESSED.key(json.load(f)["processed_filename"]))
+        except (OSError, ValueError, KeyError):
+            continue
+    return sources
+
+
+# A lazy spec renders from its no-bg PNG for as long as the spec exists, so
+# the PNG goes only after the creatives store has evicted the spec.
+PROCESSED.keep(_lazy_sources)
+
+
+def render_creative(filename: str) -> bool:
+    """
+    Render <spec_id>/<size>_<template>.<ext> (or its _thumb) on demand if it isn't on disk yet.
+
+    Concurrent calls for the same creative share one render. Returns False
+    when filename doesn't name a creative of a known render spec, or the
+    no-bg PNG it renders from is gone.
+    """
+    match = _CREATIVE_RE.fullmatch(filename)
+    templates = dict(TEMPLATES)
+    if not match or match.group(2) not in SIZES or match.group(3) not in templates:
+        return False
+
+    spec_id, size_name, name, ext = match.groups()
+    spec_dir = os.path.join(CREATIVES_FOLDER, spec_id)
+    out_path = os.path.join(spec_dir, f"{size_name}_{name}.{ext}")
+
+    with _inflight_lock:
+        lock = _inflight.setdefault(out_path, threading.Lock())
+
+    with lock:
+        try:
+            if os.path.exists(os.path.join(CREATIVES_FOLDER, filename)):
+                return True
+
+            try:
+                with open(os.path.join(spec_dir, "spec.json")) as f:
+                    spec = json.load(f)
+            except (OSError, ValueError):
+                return False
+
+            output = OutputFormat(**spec["output"])
+            if output.extension != ext:
+                return False
+
+            try:
+                product = _lazy_product(spec["processed_filename"])
+            except OSError:
+                return False
+
+            # Render beside the target and rename, so readers never see a partial file.
+            tmp_path = os.path.join(spec_dir, f".{uuid.uuid4().hex}.{ext}")
+            templates[name](
+                product,
+                tmp_path,
+                spec["tagline"],
+                spec["offer"],
+                tuple(spec["brand_color"]),
+                SIZES[size_name],
+                output,
+            )
+            if output.thumbnail:
+                os.replace(thumbnail_path(tmp_path), thumbnail_path(out_path))
+            os.replace(tmp_path, out_path)
+            return os.path.exists(os.path.join(CREATIVES_FOLDER, filename))
+        finally:
+            with _inflight_lock:
+                _inflight.pop(out_path, None)
+
+
+def creative_regions(
+    product: ProductAsset, size_name: str, template_name: str, tagline: str, offer: str, brand_color: RGB
+) -> list:
+    """Validator regions of one creative, from its template's layout."""
+    layout = dict(TEMPLATES)[template_name].__name__[len("template_"):]
+    return template_regions(layout, product, SIZES[size_name], brand_color, tagline, offer)
+
+
 def generate_all_creatives(
     processed_filename: str,
     tagline: str,
     offer: str,
     colors: List[str],
+    workers: Optional[int] = None,
+    on_render: Optional[Callable[[str, str, str], None]] = None,
+    lazy: Optional[bool] = None,
+    output: Optional[OutputFormat] = None,
+    product: Optional[ProductAsset] = None,
+    cancel: Optional[threading.Event] = None,
+    out_folder: Optional[str] = None,
+    on_canvas: Optional[Callable[[str, str, Image.Image], None]] = None,
 ):
-    in_path = os.path.join(PROCESSED_FOLDER, processed_filename)
+    """
+    Render every template at every size in SIZES.
+
+    Creatives are written under a folder named by render_spec_id. In lazy
+    mode nothing is rendered here: the spec is recorded and each creative is
+    rendered by render_creative when first requested. on_render(size_name,
+    template_name, filename) is called as each creative becomes available.
+    output selects the encoder; when it asks for thumbnails each entry also
+    gets a <template>_thumbnail filename. product may pass in an already
+    decoded asset, and setting cancel skips renders that haven't started.
+    out_folder renders somewhere other than CREATIVES_FOLDER (eager mode only).
+    on_canvas(size_name, template_name, image) receives each rendered image
+    in memory, on the render worker, before on_render (eager mode only).
+    """
+    lazy = False if out_folder else (LAZY_RENDER if lazy is None else lazy)
+    output = output or DEFAULT_OUTPUT
+    out_folder = out_folder or CREATIVES_FOLDER
 
     brand_color: RGB = normalize_rgb(colors[0]) if colors else (255, 0, 0)
+    spec_id = render_spec_id(processed_filename, tagline, offer, brand_color, output)
+    spec_dir = os.path.join(out_folder, spec_id)
+    os.makedirs(spec_dir, exist_ok=True)
+
     results = []
+    jobs = []
+    names = []
+    # Index into names of each job, and of the creatives already on disk.
+    job_names = []
+    rendered = []
+
+    if lazy:
+        spec_path = os.path.join(spec_dir, "spec.json")
+        if not os.path.exists(spec_path):
+            _write_json_atomic(spec_path, {
+                "processed_filename": processed_filename,
+                "tagline": tagline,
+                "offer": offer,
+                "brand_color": list(brand_color),
+                "output": output.to_dict(),
+            })
 
     for size_name, size in SIZES.items():
-        clean = f"{size_name}_clean.png"
-        split = f"{size_name}_split.png"
-        hero = f"{size_name}_hero.png"
-        gradient = f"{size_name}_gradient.png"
-        neon = f"{size_name}_neon.png"
-        diagonal = f"{size_name}_diagonal.png"
-
-        template_clean_minimal(in_path, os.path.join(CREATIVES_FOLDER, clean), tagline, offer, brand_color, size)
-        template_split_layout(in_path, os.path.join(CREATIVES_FOLDER, split), tagline, offer, brand_color, size)
-        template_hero_badge(in_path, os.path.join(CREATIVES_FOLDER, hero), tagline, offer, brand_color, size)
-        template_gradient_glow(in_path, os.path.join(CREATIVES_FOLDER, gradient), tagline, offer, brand_color, size)
-        template_neon_badge(in_path, os.path.join(CREATIVES_FOLDER, neon), tagline, offer, brand_color, size)
-        template_diagonal_split(in_path, os.path.join(CREATIVES_FOLDER, diagonal), tagline, offer, brand_color, size)
-
-        results.append({
-            "size": size_name,
-            "clean_template": clean,
-            "split_template": split,
-            "hero_template": hero,
-            "gradient_template": gradient,
-            "neon_template": neon,
-            "diagonal_template": diagonal,
-        })
+        entry = {"size": size_name}
+
+        for name, template in TEMPLATES:
+            filename = f"{spec_id}/{size_name}_{name}.{output.extension}"
+            entry[f"{name}_template"] = filename
+            if output.thumbnail:
+                entry[f"{name}_thumbnail"] = thumbnail_path(filename)
+            names.append((size_name, name, filename))
+            if not lazy:
+                out_path = os.path.join(out_folder, filename)
+                if _on_disk(out_path, output):
+                    rendered.append(len(names) - 1)
+                else:
+                    job_names.append(len(names) - 1)
+                    jobs.append((template, product, out_path, tagline, offer, brand_color, size, output))
+
+        results.append(entry)
+
+    if lazy:
+        if on_render:
+            for item in names:
+                on_render(*item)
+    else:
+        def finish(i: int, canvas: Image.Image) -> None:
+            size_name, name, filename = names[i]
+            if on_canvas:
+                on_canvas(size_name, name, canvas)
+            if on_render:
+                on_render(size_name, name, filename)
+
+        if jobs and product is None:
+            # Decode the no-bg PNG once; every template and size shares it.
+            product = ProductAsset.open(os.path.join(PROCESSED_FOLDER, processed_filename))
+            jobs = [job[:1] + (product,) + job[2:] for job in jobs]
+
+        # Output paths are named by spec id, so a creative on disk is the one this spec renders.
+        for i in rendered:
+            canvas = None
+            if on_canvas:
+                with Image.open(os.path.join(out_folder, names[i][2])) as f:
+                    canvas = f.copy()
+            finish(i, canvas)
+
+        render_jobs(jobs, workers, lambda i, canvas: finish(job_names[i], canvas), cancel)
 
     return results
+
+
+def generate_variants(
+    processed_filename: str,
+    variants: List[Tuple[str, str]],
+    colors: List[str],
+    workers: Optional[int] = None,
+    output: Optional[OutputFormat] = None,
+    product: Optional[ProductAsset] = None,
+    out_folder: Optional[str] = None,
+) -> dict:
+    """
+    Render every template at every size once per (tagline, offer) in variants.
+
+    Each (template, size) composes its background and product once and
+    stamps every variant's copy onto a copy of it, so extra variants cost
+    only their text and encoding. Creatives are written under a folder
+    named by variant_set_id, next to a manifest.json holding the returned
+    manifest: the variants, and per size and template the filename of each
+    variant in variant order. A set already rendered is not rendered again.
+    """
+    output = output or DEFAULT_OUTPUT
+    out_folder = out_folder or CREATIVES_FOLDER
+
+    brand_color: RGB = normalize_rgb(colors[0]) if colors else (255, 0, 0)
+    set_id = variant_set_id(processed_filename, variants, brand_color, output)
+    set_dir = os.path.join(out_folder, set_id)
+    manifest_path = os.path.join(set_dir, "manifest.json")
+
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(set_dir, exist_ok=True)
+    if product is None:
+        product = ProductAsset.open(os.path.join(PROCESSED_FOLDER, processed_filename))
+
+    matrix = []
+    jobs = []
+    for size_name, size in SIZES.items():
+        for name, template in TEMPLATES:
+            files = [f"{set_id}/{size_name}_{name}_{i}.{output.extension}" for i in range(len(variants))]
+            entry = {"size": size_name, "template": name, "files": files}
+            if output.thumbnail:
+                entry["thumbnails"] = [thumbnail_path(f) for f in files]
+            matrix.append(entry)
+
+            layout = template.__name__[len("template_"):]
+            out_paths = [os.path.join(out_folder, f) for f in files]
+            jobs.append((layout, product, size, brand_color, variants, out_paths, output))
+
+    render_jobs(jobs, workers, render=_render_variants)
+
+    manifest = {
+        "set_id": set_id,
+        "processed_filename": processed_filename,
+        "brand_color": list(brand_color),
+        "variants": [{"index": i, "tagline": t, "offer": o} for i, (t, o) in enumerate(variants)],
+        "creatives": matrix,
+    }
+    # Written last, so its presence means every file in it is on disk.
+    _write_json_atomic(manifest_path, manifest)
+    return manifest
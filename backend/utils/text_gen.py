@@ -1,11 +1,37 @@
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Optional, Sequence, Tuple
 import json
-from groq import Groq
+import logging
+import os
+import threading
+import time
 
-client = Groq(api_key="")
+from .metrics import COPY_FALLBACKS, cache_result, timed_fn
 
+logger = logging.getLogger(__name__)
 
-def generate_creative_text(product, category, colors):
-    prompt = f"""
+# "groq" calls the hosted model; "local" generates copy offline with no network.
+COPY_BACKEND = os.environ.get("COPY_BACKEND", "groq")
+# Seconds to wait for copy before answering with FALLBACK_COPY.
+COPY_TIMEOUT = float(os.environ.get("COPY_TIMEOUT", "3"))
+# Seconds a generated copy result is reused for the same inputs.
+COPY_CACHE_TTL = float(os.environ.get("COPY_CACHE_TTL", "3600"))
+COPY_CACHE_SIZE = 1024
+
+GROQ_MODEL = "llama-3.1-8b-instant"
+
+FALLBACK_COPY = {
+    "tagline": "Amazing Offer Just For You!",
+    "short_caption": "Upgrade your lifestyle today.",
+    "offer_text": "Limited-time deal. Hurry up!",
+    "seo_keywords": [],
+}
+
+
+def build_prompt(product, category, colors) -> str:
+    return f"""
     You are a creative retail ad copy generator.
 
     Generate short, catchy, high-conversion marketing text.
@@ -25,31 +51,188 @@ def generate_creative_text(product, category, colors):
     }}
     """
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}]
-    )
 
-    raw = response.choices[0].message.content.strip()
+def parse_copy(raw: str) -> dict:
+    """Copy dict from a model reply, tolerating text around the JSON."""
+    raw = raw.strip()
 
     # ---- Safe JSON parsing ----
     try:
-        result = json.loads(raw)
+        return json.loads(raw)
     except Exception:
         # AI may prepend text like "Sure! Here is JSON:"
         try:
             json_start = raw.find("{")
             json_end = raw.rfind("}") + 1
-            cleaned = raw[json_start:json_end]
-            result = json.loads(cleaned)
+            return json.loads(raw[json_start:json_end])
         except Exception:
             # Final fallback
-            result = {
-                "tagline": "Amazing Offer Just For You!",
-                "short_caption": "Upgrade your lifestyle today.",
-                "offer_text": "Limited-time deal. Hurry up!",
-                "seo_keywords": []
-            }
-
-    # ------------- RETURN FORMAT FIXED -------------
-    return result
+            return dict(FALLBACK_COPY)
+
+
+class CopyBackend(ABC):
+    """Source of ad copy. Subclasses implement generate()."""
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, product: str, category: str, colors: Sequence[str], timeout: float) -> dict:
+        """Copy dict with tagline, short_caption, offer_text and seo_keywords."""
+
+
+class GroqBackend(CopyBackend):
+    name = "groq"
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from groq import Groq
+
+                self._client = Groq(
+                    api_key=os.environ.get("GROQ_API_KEY", ""),
+                    timeout=COPY_TIMEOUT,
+                    max_retries=0,
+                )
+            return self._client
+
+    def generate(self, product, category, colors, timeout):
+        response = self._get_client().chat.completions.create(
+            model=GROQ_MODEL,
+            messages=[{"role": "user", "content": build_prompt(product, category, colors)}],
+            timeout=timeout,
+        )
+        return parse_copy(response.choices[0].message.content)
+
+
+class LocalBackend(CopyBackend):
+    """Deterministic template copy; needs no network or API key."""
+
+    name = "local"
+
+    def generate(self, product, category, colors, timeout):
+        product = product or "Product"
+        return {
+            "tagline": f"Meet the New {product}",
+            "short_caption": f"Your {category.lower()} upgrade is here.",
+            "offer_text": "Limited Offer",
+            "seo_keywords": [product.lower(), category.lower(), "deal"],
+        }
+
+
+BACKENDS: Dict[str, CopyBackend] = {
+    "groq": GroqBackend(),
+    "local": LocalBackend(),
+}
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="copy")
+_cache: "OrderedDict[Tuple, Tuple[float, dict]]" = OrderedDict()
+_cache_lock = threading.Lock()
+# Backend calls in flight by cache key, and how many requests wait on each,
+# so identical concurrent misses share one call.
+_inflight: Dict[Tuple, Tuple[Future, int]] = {}
+_inflight_lock = threading.Lock()
+
+
+def register_backend(backend: CopyBackend) -> None:
+    BACKENDS[backend.name] = backend
+
+
+def _cache_key(backend: str, product, category, colors) -> Tuple:
+    return (
+        backend,
+        str(product).strip().lower(),
+        str(category).strip().lower(),
+        tuple(str(c).strip().lower() for c in colors),
+    )
+
+
+def _cache_get(key: Tuple) -> Optional[dict]:
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is None:
+            return None
+        expires, result = hit
+        if expires < time.monotonic():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return dict(result)
+
+
+def _join(key: Tuple, submit) -> Tuple[Future, bool]:
+    """The in-flight call for key and whether this caller started it with submit(); counts the caller as waiting."""
+    with _inflight_lock:
+        future, waiters = _inflight.get(key, (None, 0))
+        started = future is None
+        if started:
+            future = submit()
+        _inflight[key] = (future, waiters + 1)
+    return future, started
+
+
+def _leave(key: Tuple, future: Future) -> None:
+    """Stop waiting on key's call; the last caller to give up cancels it if it hasn't started."""
+    with _inflight_lock:
+        current, waiters = _inflight.get(key, (None, 0))
+        if current is not future:
+            return
+        if waiters > 1:
+            _inflight[key] = (future, waiters - 1)
+            return
+    future.cancel()
+
+
+def _cache_put(key: Tuple, result: dict) -> None:
+    with _cache_lock:
+        _cache[key] = (time.monotonic() + COPY_CACHE_TTL, dict(result))
+        _cache.move_to_end(key)
+        while len(_cache) > COPY_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+@timed_fn("generate_creative_text")
+def generate_creative_text(product, category, colors, backend: Optional[str] = None, timeout: Optional[float] = None):
+    """
+    Ad copy for the product, answered from cache when the same inputs were seen recently.
+
+    The backend gets at most timeout seconds; after that (or on any backend
+    error) FALLBACK_COPY is returned. Concurrent requests for the same
+    inputs share one backend call. A call that nobody waits for any more is
+    cancelled if it hasn't started; one already running still fills the
+    cache for the next request when it replies.
+    """
+    name = backend or COPY_BACKEND
+    timeout = COPY_TIMEOUT if timeout is None else timeout
+    key = _cache_key(name, product, category, colors)
+
+    cached = _cache_get(key)
+    cache_result("copy", cached is not None)
+    if cached is not None:
+        return cached
+
+    def finish(f) -> None:
+        with _inflight_lock:
+            if _inflight.get(key, (None, 0))[0] is f:
+                del _inflight[key]
+        if not f.cancelled() and f.exception() is None and f.result() != FALLBACK_COPY:
+            _cache_put(key, f.result())
+
+    future, started = _join(key, lambda: _executor.submit(
+        BACKENDS[name].generate, product, category, list(colors), timeout))
+    if started:
+        # Outside _inflight_lock: a call that already finished runs finish() right here.
+        future.add_done_callback(finish)
+    try:
+        return dict(future.result(timeout=timeout))
+    except FutureTimeout:
+        logger.warning("copy backend %s gave no reply within %.1fs, using fallback copy", name, timeout)
+        COPY_FALLBACKS.inc(backend=name, reason="timeout")
+        _leave(key, future)
+    except Exception:
+        logger.exception("copy backend %s failed, using fallback copy", name)
+        COPY_FALLBACKS.inc(backend=name, reason="error")
+    return dict(FALLBACK_COPY)
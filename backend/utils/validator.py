@@ -1,44 +1,155 @@
+from typing import Sequence, Tuple, Union
+import os
+
 from PIL import Image
 import numpy as np
 
-def simple_validator(image_path, expected_regions):
+from .metrics import timed_fn
+
+# Minimum score (0-100) every creative must reach; 0 turns the quality gate off.
+QUALITY_GATE = float(os.environ.get("QUALITY_GATE", "0"))
+
+# Thresholds of the three per-region checks.
+COLOR_DISTANCE = 80
+MIN_CONTRAST = 25
+BRIGHTNESS_RANGE = (60, 230)
+
+# (R, G, B sums of shape (3, h + 1, w + 1), sum of squares of shape (h + 1, w + 1))
+SummedAreaTable = Tuple[np.ndarray, np.ndarray]
+
+
+def integral_image(img: Image.Image) -> SummedAreaTable:
     """
-    Upgraded non-AI validator:
-    - Checks color correctness
-    - Checks contrast
-    - Checks brightness
+    Summed-area tables of an image: the R, G and B sums, and the sum of squares over all channels.
+
+    Both are zero-padded by one row and column, so the total over any box is
+    four lookups. The channel sums fit int32 up to 8.4 megapixels, which
+    keeps a 1920x1080 table at 41 MB instead of 66 MB. Build them once per
+    creative and share them across all of that creative's regions.
     """
+    arr = np.asarray(img if img.mode == "RGB" else img.convert("RGB"))
+    h, w = arr.shape[:2]
+
+    sums = np.zeros((3, h + 1, w + 1), dtype=np.int32 if 255 * h * w < 2 ** 31 else np.int64)
+    body = sums[:, 1:, 1:]
+    body[:] = arr.transpose(2, 0, 1)
+    np.cumsum(body, axis=1, out=body)
+    np.cumsum(body, axis=2, out=body)
+
+    squares = np.zeros((h + 1, w + 1), dtype=np.int64)
+    wide = arr.astype(np.uint32)
+    squares[1:, 1:] = np.einsum("ijk,ijk->ij", wide, wide)
+    np.cumsum(squares[1:, 1:], axis=0, out=squares[1:, 1:])
+    np.cumsum(squares[1:, 1:], axis=1, out=squares[1:, 1:])
+    return sums, squares
+
+
+# Up to this many regions, score_image sums each region's pixels directly;
+# beyond it, building one integral_image for the whole canvas is cheaper.
+DIRECT_REGIONS = 8
+
+
+def _clip_boxes(bboxes: Sequence, w: int, h: int) -> Tuple[np.ndarray, ...]:
+    """(x0, y0, x1, y1) arrays of (x, y, w, h) boxes clipped to a w x h image."""
+    b = np.asarray(bboxes, dtype=np.int64).reshape(-1, 4)
+    x0 = np.clip(b[:, 0], 0, w)
+    y0 = np.clip(b[:, 1], 0, h)
+    x1 = np.maximum(np.clip(b[:, 0] + b[:, 2], 0, w), x0)
+    y1 = np.maximum(np.clip(b[:, 1] + b[:, 3], 0, h), y0)
+    return x0, y0, x1, y1
+
+
+def _checks(rgb: np.ndarray, squares: np.ndarray, n: np.ndarray, colors: Sequence) -> np.ndarray:
+    """The three checks from each region's (R, G, B) totals, sum of squares and pixel count."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_rgb = rgb / n[:, None]
+        brightness = mean_rgb.mean(axis=1)
+        variance = squares / (n * 3) - brightness ** 2
+        contrast = np.sqrt(np.maximum(variance, 0))
+        distance = np.linalg.norm(mean_rgb - np.asarray(colors, dtype=np.float64).reshape(-1, 3), axis=1)
+
+        # NaNs from empty regions compare False, failing the check.
+        return np.stack([
+            distance < COLOR_DISTANCE,
+            contrast > MIN_CONTRAST,
+            (brightness > BRIGHTNESS_RANGE[0]) & (brightness < BRIGHTNESS_RANGE[1]),
+        ], axis=1)
 
-    try:
-        img = Image.open(image_path).convert("RGB")
-        arr = np.array(img)
 
-        score = 0
-        max_score = len(expected_regions) * 3  # each region has 3 checks
+def region_checks(table: SummedAreaTable, bboxes: Sequence, colors: Sequence) -> np.ndarray:
+    """
+    (n_regions, 3) booleans: colour match, contrast and brightness per region.
+
+    bboxes are (x, y, w, h) and are clipped to the image; empty regions fail
+    every check. Each region costs a few table lookups whatever its area.
+    """
+    sums, squares = table
+    x0, y0, x1, y1 = _clip_boxes(bboxes, squares.shape[1] - 1, squares.shape[0] - 1)
+
+    def box_totals(t: np.ndarray) -> np.ndarray:
+        # Widened first, so the int32 channel sums cannot overflow.
+        return t[..., y1, x1].astype(np.int64) - t[..., y0, x1] - t[..., y1, x0] + t[..., y0, x0]
+
+    n = ((x1 - x0) * (y1 - y0)).astype(np.float64)
+    return _checks(box_totals(sums).T, box_totals(squares), n, colors)
+
+
+def direct_region_checks(img: Image.Image, bboxes: Sequence, colors: Sequence) -> np.ndarray:
+    """
+    region_checks computed from each region's own pixels, touching nothing outside them.
+
+    Each region's totals come from the 256-bin channel histograms of its
+    crop, which Pillow counts in one C pass.
+    """
+    x0, y0, x1, y1 = _clip_boxes(bboxes, img.width, img.height)
+    levels = np.arange(256, dtype=np.int64)
+
+    rgb = np.zeros((len(x0), 3), dtype=np.int64)
+    squares = np.zeros(len(x0), dtype=np.int64)
+    for i in range(len(x0)):
+        crop = img.crop((int(x0[i]), int(y0[i]), int(x1[i]), int(y1[i])))
+        hist = np.asarray((crop if crop.mode == "RGB" else crop.convert("RGB")).histogram(), dtype=np.int64)
+        hist = hist.reshape(3, 256)
+        rgb[i] = hist @ levels
+        squares[i] = (hist @ (levels * levels)).sum()
 
-        for region in expected_regions:
-            x, y, w, h = region["bbox"]
-            target_color = np.array(region["color"])
+    n = ((x1 - x0) * (y1 - y0)).astype(np.float64)
+    return _checks(rgb, squares, n, colors)
 
-            box = arr[y:y+h, x:x+w]
 
-            # 1️⃣ COLOR SIMILARITY
-            avg_color = np.mean(box, axis=(0, 1))
-            if np.linalg.norm(avg_color - target_color) < 80:
-                score += 1
+@timed_fn("validate")
+def score_image(img: Union[Image.Image, SummedAreaTable], expected_regions: Sequence[dict]) -> float:
+    """
+    Percentage of region checks an image (or its integral_image) passes.
 
-            # 2️⃣ CONTRAST
-            if box.std() > 25:
-                score += 1
+    An image with at most DIRECT_REGIONS regions is scored from the region
+    pixels alone; more regions share one integral_image.
+    """
+    if not expected_regions:
+        return 0.0
+    bboxes = [r["bbox"] for r in expected_regions]
+    colors = [r["color"] for r in expected_regions]
+    if not isinstance(img, Image.Image):
+        checks = region_checks(img, bboxes, colors)
+    elif len(expected_regions) <= DIRECT_REGIONS:
+        checks = direct_region_checks(img, bboxes, colors)
+    else:
+        checks = region_checks(integral_image(img), bboxes, colors)
+    return round(float(checks.mean()) * 100, 2)
 
-            # 3️⃣ BRIGHTNESS
-            brightness = np.mean(box)
-            if 60 < brightness < 230:
-                score += 1
 
-        return round((score / max_score) * 100, 2)
+def simple_validator(image_path, expected_regions):
+    """
+    Upgraded non-AI validator:
+    - Checks color correctness
+    - Checks contrast
+    - Checks brightness
+    """
+
+    try:
+        with Image.open(image_path) as img:
+            return score_image(img, expected_regions)
 
     except Exception as e:
         print("Validator error:", e)
         return 0
- 
\ No newline at end of file
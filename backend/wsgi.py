@@ -0,0 +1,14 @@
+"""
+Production entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py imports this once in the master before forking workers,
+so everything loaded here is shared copy-on-write by all of them.
+"""
+from app import app  # noqa: F401
+from utils.background import preload as preload_rembg
+from utils.layouts import preload_fonts
+
+preload_rembg()
+preload_fonts()